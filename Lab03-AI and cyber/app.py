@@ -1,14 +1,126 @@
-from flask import Flask, render_template, request
+from flask import Flask, g, jsonify, render_template, request
+import csv
+import io
 import os
-from model import predict_survival, train_model
+import time
+from batcher import MicroBatcher
+from drift import DriftMonitor
+from metrics import CONTENT_TYPE, Counter, CounterFunction, Gauge, Histogram, render_metrics
+from model import (
+    FEATURES, MAX_INPUT_VALUE, MAX_RELATIVES, ModelBootstrapFailed, ModelNotReady, encode_features, encode_passenger,
+    lookup_survival_table, model_holder, prediction_cache, predict_batch, predict_encoded, predict_rows, sweep_feature, sweep_values
+)
+from prediction_log import PREDICTION_LOG_DIR, PredictionLog
+from registry import UnknownModelVersion, model_registry
+from shadow import SHADOW_MODEL_PATH, ShadowScorer
 
 app = Flask(__name__)
 
+# Concurrent /api/predict requests arriving within BATCH_MAX_WAIT_MS of each
+# other are scored together in one vectorized call
+app.config['BATCH_MAX_WAIT_MS'] = float(os.environ.get('TITANIC_BATCH_MAX_WAIT_MS', 2))
+app.config['BATCH_MAX_SIZE'] = int(os.environ.get('TITANIC_BATCH_MAX_SIZE', 64))
+batcher = MicroBatcher(
+    predict_rows,
+    max_wait=app.config['BATCH_MAX_WAIT_MS'] / 1000,
+    max_batch_size=app.config['BATCH_MAX_SIZE'],
+)
 
-# Train model if it doesn't exist
-if not os.path.exists('titanic_model.pkl'):
-    print("Model not found. Training new model...")
-    train_model()
+# Candidate model scored on a copy of every single-passenger prediction,
+# in the background (see shadow.py); off unless TITANIC_SHADOW_MODEL is set
+shadow = ShadowScorer(SHADOW_MODEL_PATH) if SHADOW_MODEL_PATH else None
+
+# Histograms of live single-passenger inputs, compared against the training
+# data on /drift; constant memory however many requests arrive
+drift_monitor = DriftMonitor(FEATURES)
+
+# Binary record of every single-passenger prediction, written by a
+# background thread (see prediction_log.py); off unless TITANIC_PREDICTION_LOG is set
+prediction_log = PredictionLog(PREDICTION_LOG_DIR) if PREDICTION_LOG_DIR else None
+
+# Seconds clients are told to wait while the model is still being trained
+app.config['MODEL_RETRY_AFTER'] = int(os.environ.get('TITANIC_MODEL_RETRY_AFTER', 5))
+
+
+if os.path.exists(model_holder.path):
+    # Load the model once at startup instead of on the first request
+    model_holder.get()
+else:
+    # Train in the background (once across all workers) and answer 503 until
+    # the artifact is saved; get() picks it up without a restart
+    print("Model not found. Training new model in the background...")
+    model_holder.bootstrap()
+
+
+REQUESTS = Counter('titanic_requests_total', 'HTTP requests served.', ['endpoint', 'status'])
+REQUEST_SECONDS = Histogram('titanic_request_duration_seconds', 'Time to serve an HTTP request.', ['endpoint'])
+STAGE_SECONDS = Histogram('titanic_predict_stage_duration_seconds',
+                          'Time spent in each stage of a /predict request.', ['stage'])
+Gauge('titanic_model_generation', 'Generation of the loaded model; increases on every reload.',
+      lambda: model_holder.stats()['generation'])
+Gauge('titanic_model_load_seconds', 'Time taken to load the current model.',
+      lambda: model_holder.stats()['load_seconds'])
+CounterFunction('titanic_model_reloads_total', 'Times the model has been reloaded since startup.',
+                lambda: model_holder.reloads)
+CounterFunction('titanic_prediction_cache_hits_total', 'Predictions answered from the cache.',
+                lambda: prediction_cache.hits)
+CounterFunction('titanic_prediction_cache_misses_total', 'Predictions that had to be scored.',
+                lambda: prediction_cache.misses)
+Gauge('titanic_prediction_cache_hit_ratio', 'Share of cache lookups that hit.',
+      lambda: prediction_cache.stats()['hit_ratio'])
+# Kept per table, so these restart from zero when a reload brings a new one
+CounterFunction('titanic_survival_table_hits_total', 'Predictions answered from the survival table.',
+                lambda: (survival_table_stats() or {}).get('hits'))
+CounterFunction('titanic_survival_table_fallbacks_total', 'Survival table lookups that fell back to the model.',
+                lambda: (survival_table_stats() or {}).get('fallbacks'))
+Gauge('titanic_input_drift_max_psi', 'Largest population stability index of a live input feature.',
+      lambda: drift_report()['max_psi'])
+
+
+@app.before_request
+def start_timer():
+    g.request_start = time.perf_counter()
+
+
+@app.after_request
+def record_request(response):
+    # Label by route pattern rather than raw path to keep cardinality bounded
+    endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+    if 'request_start' in g:
+        REQUEST_SECONDS.observe(time.perf_counter() - g.request_start, endpoint)
+    REQUESTS.inc(endpoint, str(response.status_code))
+    return response
+
+
+@app.errorhandler(ModelNotReady)
+def model_not_ready(e):
+    """Ask clients to come back once the model has been trained."""
+    response = jsonify({'error': str(e)})
+    response.status_code = 503
+    response.headers['Retry-After'] = str(app.config['MODEL_RETRY_AFTER'])
+    return response
+
+
+@app.errorhandler(ModelBootstrapFailed)
+def model_bootstrap_failed(e):
+    """Training the missing model gave up; retrying the request will not help."""
+    return jsonify({'error': str(e)}), 500
+
+
+@app.errorhandler(UnknownModelVersion)
+def unknown_model_version(e):
+    return jsonify({'error': e.args[0]}), 404
+
+
+def resolve_model():
+    """The model a request picked with ``version``, or the resident one.
+
+    Returns ``(LoadedModel, PredictionCache)``.
+    """
+    version = request.values.get('version')
+    if not version:
+        return model_holder.get(), prediction_cache
+    return model_registry.get(version)
 
 
 @app.route('/')
@@ -17,43 +129,78 @@ def index():
     return render_template('index.html')
 
 
+@app.route('/model/status')
+def model_status():
+    """Report which model generation is loaded and how the cache and batcher are doing."""
+    return jsonify(dict(
+        model_holder.stats(),
+        cache=prediction_cache.stats(),
+        batcher=batcher.stats(),
+        registry=model_registry.stats(),
+        prediction_log=prediction_log.stats() if prediction_log is not None else None,
+        survival_table=survival_table_stats(),
+    ))
+
+
+@app.route('/models')
+def list_models():
+    """List registered model versions with their metadata."""
+    return jsonify({'versions': model_registry.versions(), 'registry': model_registry.stats()})
+
+
 @app.route('/predict', methods=['POST'])
 def predict():
     """Process form data and return prediction."""
     try:
-        # Get form data
-        pclass = int(request.form['pclass'])
-        sex = request.form['sex']
-        age = float(request.form['age'])
-        sibsp = int(request.form['sibsp'])
-        parch = int(request.form['parch'])
-        fare = float(request.form['fare'])
-        embarked = request.form['embarked']
-
-        # Validate inputs
-        if pclass not in [1, 2, 3]:
-            raise ValueError("Pclass must be 1, 2, or 3")
-        if sex not in ['male', 'female']:
-            raise ValueError("Sex must be 'male' or 'female'")
-        if age < 0 or age > 120:
-            raise ValueError("Age must be between 0 and 120")
-        if sibsp < 0:
-            raise ValueError("SibSp must be non-negative")
-        if parch < 0:
-            raise ValueError("Parch must be non-negative")
-        if fare < 0:
-            raise ValueError("Fare must be non-negative")
-        if embarked not in ['C', 'Q', 'S']:
-            raise ValueError("Embarked must be 'C', 'Q', or 'S'")
+        with STAGE_SECONDS.time('validation'):
+            # Get form data
+            pclass = int(request.form['pclass'])
+            sex = request.form['sex']
+            age = float(request.form['age'])
+            sibsp = int(request.form['sibsp'])
+            parch = int(request.form['parch'])
+            fare = float(request.form['fare'])
+            embarked = request.form['embarked']
+
+            # Validate inputs
+            if pclass not in [1, 2, 3]:
+                raise ValueError("Pclass must be 1, 2, or 3")
+            if sex not in ['male', 'female']:
+                raise ValueError("Sex must be 'male' or 'female'")
+            if not abs(age) <= MAX_INPUT_VALUE:
+                raise ValueError("Age must be a finite number")
+            if age < 0 or age > 120:
+                raise ValueError("Age must be between 0 and 120")
+            if sibsp < 0:
+                raise ValueError("SibSp must be non-negative")
+            if parch < 0:
+                raise ValueError("Parch must be non-negative")
+            if sibsp > MAX_RELATIVES or parch > MAX_RELATIVES:
+                raise ValueError(f"SibSp and Parch must be at most {MAX_RELATIVES}")
+            if not abs(fare) <= MAX_INPUT_VALUE:
+                raise ValueError("Fare must be a finite number")
+            if fare < 0:
+                raise ValueError("Fare must be non-negative")
+            if embarked not in ['C', 'Q', 'S']:
+                raise ValueError("Embarked must be 'C', 'Q', or 'S'")
 
         # Make prediction
-        result = predict_survival(pclass, sex, age, sibsp, parch, fare, embarked)
+        loaded, cache = resolve_model()
+        with STAGE_SECONDS.time('encoding'):
+            features = encode_features(loaded, pclass, sex, age, sibsp, parch, fare, embarked)
+        drift_monitor.update(features)
+        with STAGE_SECONDS.time('inference'):
+            result = predict_encoded(loaded, features, cache=cache)
+        if shadow is not None and cache is prediction_cache:
+            shadow.submit(features, result['survived'], result['probability'])
+        log_prediction(features, result, loaded)
 
-        return render_template(
-            'index.html',
-            prediction=result,
-            form_data=request.form
-        )
+        with STAGE_SECONDS.time('rendering'):
+            return render_template(
+                'index.html',
+                prediction=result,
+                form_data=request.form
+            )
 
     except ValueError as e:
         return render_template(
@@ -61,6 +208,8 @@ def predict():
             error=str(e),
             form_data=request.form
         )
+    except (ModelNotReady, UnknownModelVersion):
+        raise
     except Exception as e:
         return render_template(
             'index.html',
@@ -69,5 +218,154 @@ def predict():
         )
 
 
+def log_prediction(features, result, loaded):
+    """Queue a prediction for the binary log, with the time spent on the request so far."""
+    if prediction_log is not None:
+        latency_ms = (time.perf_counter() - g.request_start) * 1e3
+        prediction_log.log(features, result['survived'], result['probability'], loaded.generation, latency_ms)
+
+
+def log_predictions(X, survived, probability, loaded):
+    """Queue a batch of predictions for the binary log in one vectorized call."""
+    if prediction_log is not None:
+        latency_ms = (time.perf_counter() - g.request_start) * 1e3
+        prediction_log.log_many(X, survived, probability, loaded.generation, latency_ms)
+
+
+def batch_logger(loaded):
+    """An ``on_scored`` callback that logs scored rows against ``loaded``."""
+    return lambda X, survived, probability: log_predictions(X, survived, probability, loaded)
+
+
+def wants_explanation():
+    """Whether the request asked for per-feature contributions with ``?explain=1``."""
+    return request.args.get('explain', '').lower() in ('1', 'true', 'yes')
+
+
+def read_batch_rows():
+    """Read passenger records from a JSON or CSV request body."""
+    if request.is_json:
+        payload = request.get_json(silent=True)
+        if isinstance(payload, dict):
+            payload = payload.get('passengers')
+        if not isinstance(payload, list):
+            raise ValueError("Expected a JSON list of passengers or {\"passengers\": [...]}")
+        return payload
+
+    if 'file' in request.files:
+        text = request.files['file'].read().decode('utf-8-sig')
+    elif request.mimetype == 'text/csv':
+        text = request.get_data(as_text=True)
+    else:
+        raise ValueError("Send passengers as JSON, a text/csv body or a 'file' upload")
+    return list(csv.DictReader(io.StringIO(text)))
+
+
+@app.route('/predict/batch', methods=['POST'])
+def predict_batch_route():
+    """Score many passengers at once from JSON or CSV."""
+    try:
+        rows = read_batch_rows()
+        loaded = resolve_model()[0]
+        results = predict_batch(rows, explain=wants_explanation(), loaded=loaded, on_scored=batch_logger(loaded))
+    except (ValueError, UnicodeDecodeError) as e:
+        return jsonify({'error': str(e)}), 400
+
+    return jsonify({
+        'count': len(results),
+        'errors': sum(1 for result in results if 'error' in result),
+        'results': results,
+    })
+
+
+@app.route('/predict/sweep', methods=['POST'])
+def predict_sweep():
+    """Score a survival curve as one feature varies, in a single model call.
+
+    Expects JSON ``{"passenger": {...}, "feature": "age"}`` with either
+    ``"values": [...]`` or ``"start"``, ``"stop"`` and ``"steps"``.
+    """
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict):
+        return jsonify({'error': "Expected a JSON object"}), 400
+    try:
+        values = payload.get('values')
+        if values is None:
+            values = sweep_values(payload.get('start'), payload.get('stop'), payload.get('steps', 50))
+        elif not isinstance(values, list):
+            raise ValueError("values must be a list")
+        loaded = resolve_model()[0]
+        survived, probability = sweep_feature(payload.get('passenger'), payload.get('feature'), values, loaded,
+                                              on_scored=batch_logger(loaded))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    return jsonify({
+        'feature': payload['feature'],
+        'values': values,
+        'survived': survived.tolist(),
+        'probability': probability.tolist(),
+    })
+
+
+@app.route('/api/predict', methods=['POST'])
+def api_predict():
+    """Score one passenger sent as JSON, batched with concurrent requests."""
+    payload = request.get_json(silent=True)
+    try:
+        loaded, cache = resolve_model()
+        row = encode_passenger(payload, loaded)
+        drift_monitor.update(row)
+        if wants_explanation() or cache is not prediction_cache:
+            # The batcher scores with the resident model; explained predictions
+            # and other versions are scored directly
+            result = predict_encoded(loaded, tuple(row.tolist()), wants_explanation(), cache)
+            log_prediction(row, result, loaded)
+            return jsonify(result)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    # A survival table hit needs no batching
+    answer = lookup_survival_table(loaded, tuple(row.tolist()))
+    result = {'survived': answer[0], 'probability': answer[1]} if answer else batcher.predict(row)
+    if shadow is not None:
+        shadow.submit(row, result['survived'], result['probability'])
+    log_prediction(row, result, loaded)
+    return jsonify(result)
+
+
+@app.route('/shadow')
+def shadow_report():
+    """Compare the shadow candidate with the serving model on live traffic."""
+    if shadow is None:
+        return jsonify({'error': "No shadow model configured; set TITANIC_SHADOW_MODEL"}), 404
+    return jsonify(shadow.report())
+
+
+def drift_report():
+    """Drift of live inputs against the resident model's training data."""
+    current = model_holder.stats()
+    reference = model_holder.get().drift_reference if current['loaded'] else None
+    return drift_monitor.report(reference)
+
+
+def survival_table_stats():
+    """Hits and coverage of the resident model's survival table, if it has one."""
+    current = model_holder.stats()
+    table = model_holder.get().survival_table if current['loaded'] else None
+    return table.stats() if table is not None else None
+
+
+@app.route('/drift')
+def drift():
+    """Population stability index of each input feature, live vs training."""
+    return jsonify(drift_report())
+
+
+@app.route('/metrics')
+def metrics():
+    """Expose request, stage, model and cache metrics for Prometheus."""
+    return render_metrics(), 200, {'Content-Type': CONTENT_TYPE}
+
+
 if __name__ == '__main__':
     app.run(debug=True)
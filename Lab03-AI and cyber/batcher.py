@@ -0,0 +1,91 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+
+class MicroBatcher:
+    """Merge concurrent single-row predictions into one vectorized call.
+
+    Callers ``submit`` one encoded feature row and get a Future back. A
+    background thread takes the first waiting row, collects whatever else
+    arrives within ``max_wait`` seconds (up to ``max_batch_size`` rows),
+    scores the whole batch with a single call to ``score_rows`` and hands
+    each caller its own result. ``score_rows`` takes a 2-D array and returns
+    one result per row, in order.
+
+    The thread is started on first use, so a batcher created before a
+    server forks its workers still runs in every worker.
+    """
+
+    def __init__(self, score_rows, max_wait=0.002, max_batch_size=64):
+        self.score_rows = score_rows
+        self.max_wait = max_wait
+        self.max_batch_size = max_batch_size
+        self.batches = 0
+        self.rows = 0
+        self.largest_batch = 0
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, row):
+        """Queue one feature row; returns a Future for its result."""
+        self._ensure_started()
+        future = Future()
+        self._queue.put((row, future))
+        return future
+
+    def predict(self, row, timeout=None):
+        """Score one feature row, waiting for the batch it lands in."""
+        return self.submit(row).result(timeout)
+
+    def _ensure_started(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='micro-batcher', daemon=True)
+                self._thread.start()
+
+    def _collect(self):
+        """Block for one request, then gather more until the wait or size limit."""
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            futures = [future for _, future in batch]
+            try:
+                results = self.score_rows(np.array([row for row, _ in batch]))
+            except Exception as e:
+                for future in futures:
+                    future.set_exception(e)
+                continue
+
+            self.batches += 1
+            self.rows += len(batch)
+            self.largest_batch = max(self.largest_batch, len(batch))
+            for future, result in zip(futures, results):
+                future.set_result(result)
+
+    def stats(self):
+        """Counters for monitoring."""
+        return {
+            'batches': self.batches,
+            'rows': self.rows,
+            'mean_batch_size': self.rows / self.batches if self.batches else 0.0,
+            'largest_batch': self.largest_batch,
+            'max_wait_ms': self.max_wait * 1e3,
+            'max_batch_size': self.max_batch_size,
+        }
@@ -0,0 +1,421 @@
+import argparse
+import itertools
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from forest import export_forest
+from model import ENGINES, MODEL_PATH, load_model
+
+# Run in a fresh interpreter to time a cold start of the web app
+STARTUP_SCRIPT = '''
+import json, sys, time, warnings
+warnings.filterwarnings('ignore')
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+from model import predict_survival
+predict_survival(3, 'male', 30.0, 0, 0, 8.05, 'S')
+predicted = time.perf_counter()
+print(json.dumps({
+    'import_ms': (imported - start) * 1e3,
+    'first_prediction_ms': (predicted - start) * 1e3,
+    'modules': sorted(m for m in ('pandas', 'seaborn', 'sklearn', 'joblib') if m in sys.modules),
+}))
+'''
+
+# Training-only dependencies that must never load while serving. Unpickling
+# a scikit-learn model pulls in pandas through scikit-learn itself; the
+# memory-mapped '.forest' format must need neither.
+FORBIDDEN_MODULES = ['seaborn']
+FORBIDDEN_MODULES_FOREST = ['pandas', 'seaborn', 'sklearn', 'joblib']
+
+# Artifacts pickled by another scikit-learn release warn on every load, and
+# the forest was fitted with feature names that NumPy inputs do not carry
+warnings.filterwarnings('ignore')
+
+
+def random_passengers(n, seed=0):
+    """Return ``n`` random encoded passengers in ``FEATURES`` order."""
+    rng = np.random.default_rng(seed)
+    return np.column_stack([
+        rng.integers(1, 4, n),
+        rng.integers(0, 2, n),
+        rng.uniform(0, 80, n).round(1),
+        rng.integers(0, 6, n),
+        rng.integers(0, 4, n),
+        rng.uniform(0, 300, n).round(2),
+        rng.integers(0, 3, n),
+    ]).astype(float)
+
+
+def random_records(n, seed=0):
+    """Return ``n`` random raw passenger records, as a form or JSON client sends them."""
+    rng = np.random.default_rng(seed)
+    return [
+        {
+            'pclass': int(rng.integers(1, 4)),
+            'sex': str(rng.choice(['male', 'female'])),
+            'age': float(rng.integers(1, 80)),
+            'sibsp': int(rng.integers(0, 4)),
+            'parch': int(rng.integers(0, 3)),
+            'fare': round(float(rng.uniform(5, 250)), 2),
+            'embarked': str(rng.choice(['C', 'Q', 'S'])),
+        }
+        for _ in range(n)
+    ]
+
+
+def time_calls(fn, repeat, warmup=3):
+    """Call ``fn`` repeatedly and return the duration of each call in seconds."""
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return np.array(samples)
+
+
+def summarize(samples, items_per_call=1):
+    """Latency percentiles in milliseconds and throughput in items per second."""
+    return {
+        'calls': len(samples),
+        'per_second': float(items_per_call * len(samples) / samples.sum()),
+        'mean_ms': float(samples.mean() * 1e3),
+        'p50_ms': float(np.percentile(samples, 50) * 1e3),
+        'p95_ms': float(np.percentile(samples, 95) * 1e3),
+        'p99_ms': float(np.percentile(samples, 99) * 1e3),
+    }
+
+
+def bench_forest(args):
+    """Compare scikit-learn and the flat NumPy forest."""
+    model, _ = load_model(args.model)
+    start = time.perf_counter()
+    forest = export_forest(model)
+    export_seconds = time.perf_counter() - start
+
+    X = random_passengers(max(args.batch_sizes))
+    exact = bool(
+        np.array_equal(model.predict_proba(X), forest.predict_proba(X))
+        and np.array_equal(model.predict(X), forest.predict(X))
+    )
+    print(f"Flat forest: {forest.n_trees} trees, {forest.n_nodes} nodes, depth {forest.max_depth}")
+    print(f"Export time: {export_seconds * 1e3:.1f} ms")
+    print(f"Matches scikit-learn exactly on {len(X)} rows: {exact}")
+
+    row = X[:1]
+    results = {
+        'export_ms': export_seconds * 1e3,
+        'exact_match': exact,
+        # The original predict_survival path: predict plus predict_proba
+        'single_sklearn': summarize(time_calls(lambda: (model.predict(row), model.predict_proba(row)), args.repeat)),
+        'single_flat': summarize(time_calls(lambda: forest.predict_proba(row), args.repeat)),
+        'batches': {},
+    }
+    print(f"\n{'rows':>8} {'sklearn p50 ms':>16} {'flat p50 ms':>14}")
+    print(f"{1:>8} {results['single_sklearn']['p50_ms']:>16.3f} {results['single_flat']['p50_ms']:>14.3f}")
+
+    for size in args.batch_sizes:
+        batch = X[:size]
+        repeat = max(3, args.repeat // size)
+        sklearn_stats = summarize(time_calls(lambda: model.predict_proba(batch), repeat))
+        flat_stats = summarize(time_calls(lambda: forest.predict_proba(batch), repeat))
+        results['batches'][size] = {'sklearn': sklearn_stats, 'flat': flat_stats}
+        print(f"{size:>8} {sklearn_stats['p50_ms']:>16.3f} {flat_stats['p50_ms']:>14.3f}")
+
+    speedup = results['single_sklearn']['p50_ms'] / results['single_flat']['p50_ms']
+    print(f"\nSingle-row speedup: {speedup:.1f}x")
+    results['single_row_speedup'] = speedup
+    return results, exact
+
+
+def bench_startup(args):
+    """Time importing the app and serving its first prediction in a new process."""
+    env = dict(os.environ, TITANIC_MODEL_PATH=args.model)
+    runs = []
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        output = subprocess.run(
+            [sys.executable, '-c', STARTUP_SCRIPT],
+            env=env, capture_output=True, text=True, check=True,
+        ).stdout
+        run = json.loads(output.strip().splitlines()[-1])
+        run['process_ms'] = (time.perf_counter() - start) * 1e3
+        runs.append(run)
+
+    results = {
+        'model': args.model,
+        'runs': len(runs),
+        'import_ms': float(np.median([run['import_ms'] for run in runs])),
+        'first_prediction_ms': float(np.median([run['first_prediction_ms'] for run in runs])),
+        'process_ms': float(np.median([run['process_ms'] for run in runs])),
+        'modules': runs[-1]['modules'],
+    }
+    print(f"Cold start serving {args.model} (median of {len(runs)} runs):")
+    print(f"  import app:             {results['import_ms']:8.1f} ms")
+    print(f"  first prediction ready: {results['first_prediction_ms']:8.1f} ms")
+    print(f"  whole process:          {results['process_ms']:8.1f} ms")
+    print(f"  heavy modules loaded:   {', '.join(results['modules']) or 'none'}")
+
+    ok = True
+    forbidden = FORBIDDEN_MODULES_FOREST if os.path.isdir(args.model) else FORBIDDEN_MODULES
+    unexpected = sorted(set(results['modules']) & set(forbidden))
+    if unexpected:
+        print(f"FAIL: serving imported {', '.join(unexpected)}")
+        ok = False
+    if args.budget_ms is not None and results['first_prediction_ms'] > args.budget_ms:
+        print(f"FAIL: first prediction took longer than the {args.budget_ms:.0f} ms budget")
+        ok = False
+    return results, ok
+
+
+def bench_serving(args):
+    """Latency and throughput of the prediction paths, optionally against a baseline."""
+    import model
+    model.model_holder.path = args.model
+    from app import app
+
+    client = app.test_client()
+    # Mostly distinct passengers, so the prediction cache rarely answers
+    distinct = itertools.cycle(random_records(args.repeat * 4))
+
+    def direct_uncached():
+        r = next(distinct)
+        model.prediction_cache.clear()
+        model.predict_survival(r['pclass'], r['sex'], r['age'], r['sibsp'], r['parch'], r['fare'], r['embarked'])
+
+    def form_post():
+        client.post('/predict', data=next(distinct))
+
+    def api_post():
+        client.post('/api/predict', json=next(distinct))
+
+    batch = random_records(args.batch_size, seed=1)
+    scenarios = {
+        'direct_single': summarize(time_calls(direct_uncached, args.repeat)),
+        'direct_single_cached': summarize(time_calls(lambda: model.predict_survival(3, 'male', 30, 0, 0, 8, 'S'), args.repeat)),
+        'route_predict': summarize(time_calls(form_post, args.repeat)),
+        'route_api_predict': summarize(time_calls(api_post, args.repeat)),
+        'direct_batch': summarize(time_calls(lambda: model.predict_batch(batch), args.batch_repeat), args.batch_size),
+        'route_predict_batch': summarize(
+            time_calls(lambda: client.post('/predict/batch', json=batch), args.batch_repeat), args.batch_size
+        ),
+    }
+
+    def concurrent_api(record):
+        start = time.perf_counter()
+        with app.test_client() as thread_client:
+            thread_client.post('/api/predict', json=record)
+        return time.perf_counter() - start
+
+    concurrent_records = random_records(args.repeat * 4, seed=2)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(args.threads) as pool:
+        samples = np.array(list(pool.map(concurrent_api, concurrent_records)))
+    wall = time.perf_counter() - start
+    scenarios['concurrent_api_predict'] = dict(summarize(samples), per_second=len(samples) / wall, threads=args.threads)
+
+    print(f"{'scenario':<24} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'per sec':>10}")
+    for name, stats in scenarios.items():
+        print(f"{name:<24} {stats['p50_ms']:>9.3f} {stats['p95_ms']:>9.3f} {stats['p99_ms']:>9.3f} {stats['per_second']:>10.0f}")
+
+    results = {'scenarios': scenarios, 'batch_size': args.batch_size, 'threads': args.threads}
+    ok = True
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare_to_baseline(scenarios, baseline['scenarios'], args.tolerance)
+        results['regressions'] = regressions
+        for regression in regressions:
+            print(f"REGRESSION: {regression}")
+        ok = not regressions
+        if ok:
+            print(f"No regressions against {args.baseline} (tolerance {args.tolerance:.0%})")
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline written to {args.save_baseline}")
+    return results, ok
+
+
+def _artifact_bytes(path):
+    if os.path.isdir(path):
+        return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+    return os.path.getsize(path) if os.path.exists(path) else 0
+
+
+def bench_engines(args):
+    """Train every engine on the same split and compare them head to head."""
+    import model
+    from prediction_cache import PredictionCache
+    from sklearn.model_selection import train_test_split
+
+    X, y, label_encoders = model.load_and_preprocess_data()
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+    encoded = itertools.cycle(random_passengers(args.repeat * 4).tolist())
+    batch = random_records(args.batch_size, seed=1)
+    # A cache that never stores anything, so every single-row call is scored
+    uncached = PredictionCache(0)
+
+    directory = tempfile.mkdtemp()
+    results = {}
+    try:
+        for engine in args.engines:
+            estimator = model.make_estimator(engine)
+            start = time.perf_counter()
+            estimator.fit(X_train, y_train)
+            train_seconds = time.perf_counter() - start
+
+            path = os.path.join(directory, f'{engine}.pkl')
+            model.save_model(estimator, label_encoders, path)
+            loaded = model.ModelHolder(path).get()
+
+            single = time_calls(lambda: model.predict_encoded(loaded, tuple(next(encoded)), cache=uncached),
+                                args.repeat)
+            batched = time_calls(lambda: model.predict_batch(batch, loaded=loaded), args.batch_repeat)
+            results[engine] = {
+                'estimator': type(estimator).__name__,
+                'train_seconds': train_seconds,
+                'pickle_bytes': _artifact_bytes(path),
+                'forest_bytes': _artifact_bytes(model.forest_path_for(path)),
+                'load_ms': loaded.load_seconds * 1e3,
+                'single': summarize(single),
+                'batch': summarize(batched, args.batch_size),
+                'accuracy': float(estimator.score(X_test, y_test)),
+            }
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    print(f"\n{'engine':<10} {'train s':>8} {'pickle KiB':>11} {'load ms':>8} {'1-row p50 ms':>13} "
+          f"{f'{args.batch_size}-row p50 ms':>15} {'accuracy':>9}")
+    for engine, stats in results.items():
+        print(f"{engine:<10} {stats['train_seconds']:>8.2f} {stats['pickle_bytes'] / 1024:>11.0f} "
+              f"{stats['load_ms']:>8.1f} {stats['single']['p50_ms']:>13.3f} {stats['batch']['p50_ms']:>15.2f} "
+              f"{stats['accuracy']:>9.4f}")
+    return {'engines': results, 'batch_size': args.batch_size}, True
+
+
+def bench_scaling(args):
+    """Score one large batch with 1..N worker processes sharing the forest."""
+    import model
+    from shared_scoring import score_parallel
+
+    loaded = model.ModelHolder(args.model).get()
+    records = random_records(args.rows)
+    columns = {name: [record[name] for record in records] for name in model.FEATURES}
+
+    start = time.perf_counter()
+    expected = model.score_columns(loaded, columns)
+    serial_seconds = time.perf_counter() - start
+    print(f"In-process: {args.rows} rows in {serial_seconds:.2f}s ({args.rows / serial_seconds:.0f} rows/sec)")
+
+    results = {}
+    ok = True
+    print(f"\n{'workers':>7} {'seconds':>8} {'rows/sec':>10} {'speedup':>8} {'efficiency':>11}")
+    for workers in range(1, args.max_workers + 1):
+        start = time.perf_counter()
+        survived, probability, errors = score_parallel(loaded, columns, workers, args.chunk_size)
+        seconds = time.perf_counter() - start
+        # Worker count must never change a prediction or its order
+        same = (np.array_equal(survived, expected[0]) and np.array_equal(probability, expected[1])
+                and errors == expected[2])
+        ok = ok and same
+        # Against in-process scoring, so below 1 means the pool is not worth it
+        speedup = serial_seconds / seconds
+        results[workers] = {
+            'seconds': seconds,
+            'rows_per_second': args.rows / seconds,
+            'speedup': speedup,
+            'efficiency': speedup / workers,
+            'matches_in_process': same,
+        }
+        print(f"{workers:>7} {seconds:>8.2f} {args.rows / seconds:>10.0f} {speedup:>8.2f} {speedup / workers:>11.0%}"
+              + ("" if same else "  MISMATCH"))
+    print(f"({os.cpu_count()} cores available; times include starting the pool and attaching to the forest)")
+    # Workers walk the NumPy forest, which is slower per core than the
+    # compiled scikit-learn trees used in-process
+    per_core = serial_seconds / results[1]['seconds'] if results else None
+    if per_core:
+        print(f"One worker runs at {per_core:.2f}x in-process speed; break-even needs about "
+              f"{int(np.ceil(1 / per_core))} workers on free cores")
+    return {'rows': args.rows, 'in_process_seconds': serial_seconds, 'per_core_ratio': per_core,
+            'workers': results}, ok
+
+
+def compare_to_baseline(scenarios, baseline, tolerance):
+    """Describe every scenario that got slower than the baseline allows."""
+    regressions = []
+    for name, stats in scenarios.items():
+        if name not in baseline:
+            continue
+        base = baseline[name]
+        for metric in ('p50_ms', 'p95_ms'):
+            if stats[metric] > base[metric] * (1 + tolerance):
+                regressions.append(f"{name} {metric} {stats[metric]:.3f} > baseline {base[metric]:.3f}")
+        if stats['per_second'] < base['per_second'] * (1 - tolerance):
+            regressions.append(f"{name} per_second {stats['per_second']:.0f} < baseline {base['per_second']:.0f}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks for the Titanic survival model.")
+    parser.add_argument('--model', default=MODEL_PATH, help="model artifact to benchmark")
+    parser.add_argument('--output', help="write results to this JSON file")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    forest = subparsers.add_parser('forest', help="flat NumPy forest vs scikit-learn")
+    forest.add_argument('--repeat', type=int, default=200, help="timed calls per measurement")
+    forest.add_argument('--batch-sizes', type=int, nargs='+', default=[10, 100, 1000, 10000])
+    forest.set_defaults(run=bench_forest)
+
+    startup = subparsers.add_parser('startup', help="cold-start import time and time to first prediction")
+    startup.add_argument('--repeat', type=int, default=5, help="fresh processes to start")
+    startup.add_argument('--budget-ms', type=float, help="fail if the first prediction takes longer than this")
+    startup.set_defaults(run=bench_startup)
+
+    serving = subparsers.add_parser('serving', help="latency and throughput of predict_survival and the routes")
+    serving.add_argument('--repeat', type=int, default=300, help="timed calls per single-row scenario")
+    serving.add_argument('--batch-size', type=int, default=1000, help="rows per batch scenario")
+    serving.add_argument('--batch-repeat', type=int, default=20, help="timed calls per batch scenario")
+    serving.add_argument('--threads', type=int, default=16, help="client threads for the concurrent scenario")
+    serving.add_argument('--baseline', help="fail if slower than the results stored in this JSON file")
+    serving.add_argument('--tolerance', type=float, default=0.25, help="allowed slowdown against the baseline")
+    serving.add_argument('--save-baseline', help="store these results as a baseline")
+    serving.set_defaults(run=bench_serving)
+
+    engines = subparsers.add_parser('engines', help="train each estimator engine and compare them head to head")
+    engines.add_argument('--engines', nargs='+', choices=list(ENGINES), default=list(ENGINES))
+    engines.add_argument('--repeat', type=int, default=300, help="timed single-row calls per engine")
+    engines.add_argument('--batch-size', type=int, default=1000, help="rows per batch call")
+    engines.add_argument('--batch-repeat', type=int, default=20, help="timed batch calls per engine")
+    engines.set_defaults(run=bench_engines)
+
+    scaling = subparsers.add_parser('scaling', help="multi-process scoring with a shared-memory forest, 1..N workers, "
+                                     "with speedup against in-process scoring")
+    scaling.add_argument('--rows', type=int, default=200000, help="rows to score")
+    scaling.add_argument('--max-workers', type=int, default=os.cpu_count(), help="largest worker count to try")
+    scaling.add_argument('--chunk-size', type=int, default=10000, help="rows per task sent to a worker")
+    scaling.set_defaults(run=bench_scaling)
+
+    args = parser.parse_args(argv)
+    results, ok = args.run(args)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
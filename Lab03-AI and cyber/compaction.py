@@ -0,0 +1,201 @@
+import io
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+from forest import FlatForest, export_forest, load_forest, save_forest
+
+# Defaults for `python model.py train --compact`
+COMPACT_MAX_DEPTH = 10
+COMPACT_MIN_TREES = 20
+
+
+def node_depths(forest):
+    """Depth of every node below its tree's root."""
+    depth = np.zeros(forest.n_nodes, dtype=np.int32)
+    frontier = np.asarray(forest.roots)
+    level = 0
+    while len(frontier):
+        depth[frontier] = level
+        frontier = frontier[forest.left[frontier] != frontier]
+        frontier = np.concatenate([forest.left[frontier], forest.right[frontier]])
+        level += 1
+    return depth
+
+
+def _rebuild(forest, keep, make_leaf):
+    """A new forest holding only the ``keep`` nodes, with ``make_leaf`` nodes turned into leaves."""
+    new_index = (np.cumsum(keep) - 1).astype(np.int32)
+    nodes = np.flatnonzero(keep)
+    leaf = make_leaf[nodes] | (forest.left[nodes] == nodes)
+    self_index = new_index[nodes]
+    feature = np.where(leaf, 0, forest.feature[nodes]).astype(np.int32)
+    return FlatForest(
+        feature=feature,
+        threshold=np.where(leaf, 0.0, forest.threshold[nodes]).astype(forest.threshold.dtype),
+        left=np.where(leaf, self_index, new_index[forest.left[nodes]]).astype(np.int32),
+        right=np.where(leaf, self_index, new_index[forest.right[nodes]]).astype(np.int32),
+        value=np.array(forest.value[nodes]),
+        roots=new_index[forest.roots[keep[forest.roots]]],
+        max_depth=forest.max_depth,
+        classes=forest.classes_,
+    )
+
+
+def truncate_depth(forest, max_depth):
+    """Cut every tree at ``max_depth``.
+
+    Nodes at that depth become leaves predicting the class distribution of
+    the training rows that reached them, which the flat forest already
+    stores for internal nodes.
+    """
+    depth = node_depths(forest)
+    truncated = _rebuild(forest, depth <= max_depth, depth == max_depth)
+    truncated.max_depth = min(forest.max_depth, max_depth)
+    return truncated
+
+
+def select_trees(forest, X, y, max_accuracy_drop=0.0, min_trees=COMPACT_MIN_TREES):
+    """Greedily drop trees that held-out accuracy shows are redundant.
+
+    Each round removes the tree whose removal leaves the best accuracy on
+    ``(X, y)``, for as long as accuracy stays within ``max_accuracy_drop`` of
+    the full forest's and at least ``min_trees`` remain. Every candidate
+    removal is scored at once from the per-tree probabilities, so a round is
+    a single (rows x trees) array operation. Returns a mask of trees to keep.
+    """
+    if len(forest.classes_) != 2:
+        raise ValueError("Tree selection supports binary classifiers")
+    target = np.asarray(y) == forest.classes_[1]
+    per_tree = np.asarray(forest.value[forest.apply(X), 1], dtype=float)
+    total = per_tree.sum(axis=1)
+    # The forest predicts class 1 when the mean probability beats 0.5
+    baseline = np.mean((total > forest.n_trees / 2) == target)
+
+    kept = np.ones(forest.n_trees, dtype=bool)
+    while kept.sum() > min_trees:
+        candidates = np.flatnonzero(kept)
+        remaining = total[:, np.newaxis] - per_tree[:, candidates]
+        accuracy = np.mean((remaining > (len(candidates) - 1) / 2) == target[:, np.newaxis], axis=0)
+        best = int(np.argmax(accuracy))
+        if accuracy[best] < baseline - max_accuracy_drop:
+            break
+        kept[candidates[best]] = False
+        total = remaining[:, best]
+    return kept
+
+
+def keep_trees(forest, kept):
+    """A forest holding only the trees where ``kept`` is True."""
+    tree_of_node = np.searchsorted(forest.roots, np.arange(forest.n_nodes), side='right') - 1
+    return _rebuild(forest, kept[tree_of_node], np.zeros(forest.n_nodes, dtype=bool))
+
+
+def to_float32(forest):
+    """Store thresholds and node values as float32.
+
+    Thresholds are rounded down to the nearest float32, so comparing a
+    float32 input against them gives exactly the same split as the float64
+    threshold did.
+    """
+    threshold = np.asarray(forest.threshold).astype(np.float32)
+    too_high = threshold > forest.threshold
+    threshold[too_high] = np.nextafter(threshold[too_high], np.float32(-np.inf))
+    return FlatForest(
+        feature=forest.feature,
+        threshold=threshold,
+        left=forest.left,
+        right=forest.right,
+        value=np.asarray(forest.value, dtype=np.float32),
+        roots=forest.roots,
+        max_depth=forest.max_depth,
+        classes=forest.classes_,
+    )
+
+
+def compact_forest(forest, X_val, y_val, max_depth=COMPACT_MAX_DEPTH, max_accuracy_drop=0.0,
+                   min_trees=COMPACT_MIN_TREES):
+    """Cap depth, drop redundant trees and shrink the arrays to float32."""
+    if max_depth is not None and max_depth < forest.max_depth:
+        forest = truncate_depth(forest, max_depth)
+    forest = keep_trees(forest, select_trees(forest, X_val, y_val, max_accuracy_drop, min_trees))
+    return to_float32(forest)
+
+
+def _directory_size(path):
+    return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+
+
+def measure_artifact(model, X_test, y_test, repeat=200):
+    """Artifact size, load time, single-row latency and accuracy of a model."""
+    import joblib
+
+    buffer = io.BytesIO()
+    joblib.dump({'model': model}, buffer)
+    start = time.perf_counter()
+    joblib.load(io.BytesIO(buffer.getvalue()))
+    pickle_load_ms = (time.perf_counter() - start) * 1e3
+
+    forest = model if isinstance(model, FlatForest) else export_forest(model)
+    directory = tempfile.mkdtemp()
+    try:
+        forest_path = os.path.join(directory, 'model.forest')
+        save_forest(forest, forest_path)
+        start = time.perf_counter()
+        load_forest(forest_path)
+        forest_load_ms = (time.perf_counter() - start) * 1e3
+        forest_bytes = _directory_size(forest_path)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    # The serving path: one passenger through the flat forest
+    row = np.asarray(X_test, dtype=float)[:1]
+    forest.predict_proba(row)
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        forest.predict_proba(row)
+        samples.append(time.perf_counter() - start)
+
+    return {
+        'n_trees': forest.n_trees,
+        'n_nodes': forest.n_nodes,
+        'max_depth': forest.max_depth,
+        'pickle_bytes': len(buffer.getvalue()),
+        'pickle_load_ms': pickle_load_ms,
+        'forest_bytes': forest_bytes,
+        'forest_load_ms': forest_load_ms,
+        'latency_ms': float(np.median(samples) * 1e3),
+        'accuracy': float(np.mean(forest.predict(X_test) == np.asarray(y_test))),
+    }
+
+
+def compact_model(model, X_val, y_val, X_test, y_test, max_depth=COMPACT_MAX_DEPTH,
+                  max_accuracy_drop=0.0, report_path='compaction_report.json'):
+    """Compact a fitted forest and report what it saved.
+
+    Trees are chosen on ``(X_val, y_val)``; the report compares the model
+    before and after on ``(X_test, y_test)``. Returns ``(compact_forest, report)``.
+    """
+    compact = compact_forest(export_forest(model), X_val, y_val, max_depth, max_accuracy_drop)
+    report = {
+        'max_depth': max_depth,
+        'max_accuracy_drop': max_accuracy_drop,
+        'before': measure_artifact(model, X_test, y_test),
+        'after': measure_artifact(compact, X_test, y_test),
+    }
+    with open(report_path, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    print("Compaction:        before     after")
+    for key, label in [('n_trees', 'trees'), ('max_depth', 'max depth'), ('pickle_bytes', 'pickle bytes'),
+                       ('forest_bytes', 'forest bytes'), ('pickle_load_ms', 'load ms'),
+                       ('latency_ms', 'latency ms'), ('accuracy', 'accuracy')]:
+        before, after = report['before'][key], report['after'][key]
+        print(f"  {label:<14} {before:>9.4g} {after:>9.4g}")
+    print(f"Compaction report written to {report_path}")
+    return compact, report
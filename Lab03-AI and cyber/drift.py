@@ -0,0 +1,118 @@
+import threading
+
+import numpy as np
+
+# Upper bin edges for each encoded feature. Age and fare get fixed-bin
+# histograms; the categorical and small-count features get one bin
+# per value (sex and embarked are label codes, sibsp/parch top out in the
+# last bin).
+DRIFT_BINS = {
+    'pclass': [1.5, 2.5],
+    'sex': [0.5],
+    'age': [5, 10, 15, 20, 25, 30, 35, 40, 50, 60, 70],
+    'sibsp': [0.5, 1.5, 2.5, 3.5],
+    'parch': [0.5, 1.5, 2.5],
+    'fare': [5, 10, 15, 25, 50, 75, 100, 200],
+    'embarked': [0.5, 1.5],
+}
+
+# Population stability index levels commonly read as "some" and "major" shift
+PSI_MODERATE = 0.1
+PSI_SIGNIFICANT = 0.25
+# Live inputs needed before a drift status is reported
+MIN_SAMPLES = 100
+
+
+def _bin(values, edges):
+    return np.searchsorted(edges, values, side='right')
+
+
+def reference_histograms(X):
+    """Bin counts of a training matrix (a DataFrame with feature columns).
+
+    Saved with the model, so live inputs can be compared with the data the
+    model was fitted on.
+    """
+    reference = {}
+    for name, edges in DRIFT_BINS.items():
+        counts = np.bincount(_bin(np.asarray(X[name], dtype=float), edges), minlength=len(edges) + 1)
+        reference[name] = counts.tolist()
+    return reference
+
+
+def population_stability_index(expected, actual, epsilon=1e-4):
+    """PSI between two histograms over the same bins; 0 means identical shares."""
+    expected = np.asarray(expected, dtype=float)
+    actual = np.asarray(actual, dtype=float)
+    p = np.maximum(expected / max(expected.sum(), 1), epsilon)
+    q = np.maximum(actual / max(actual.sum(), 1), epsilon)
+    return float(np.sum((q - p) * np.log(q / p)))
+
+
+class DriftMonitor:
+    """Streaming histograms of live model inputs in constant memory.
+
+    ``update`` adds encoded feature rows (columns in ``features`` order) to
+    fixed bins, so memory does not grow with traffic and no request is
+    stored. ``report`` compares the counts so far against the reference
+    histograms saved with a model.
+    """
+
+    def __init__(self, features):
+        self.features = list(features)
+        self._columns = [(self.features.index(name), name, np.asarray(edges, dtype=float))
+                         for name, edges in DRIFT_BINS.items()]
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Forget everything seen so far, for example after a deployment."""
+        with self._lock:
+            self.samples = 0
+            self.counts = {name: np.zeros(len(edges) + 1, dtype=np.int64) for _, name, edges in self._columns}
+
+    def update(self, X):
+        """Count one encoded row or a matrix of them."""
+        X = np.asarray(X, dtype=float)
+        if X.ndim == 1:
+            X = X[np.newaxis, :]
+        bins = [(name, _bin(X[:, index], edges)) for index, name, edges in self._columns]
+        with self._lock:
+            self.samples += len(X)
+            for name, index in bins:
+                np.add.at(self.counts[name], index, 1)
+
+    def report(self, reference):
+        """Per-feature PSI against ``reference`` and an overall status."""
+        with self._lock:
+            samples = self.samples
+            counts = {name: counts.tolist() for name, counts in self.counts.items()}
+
+        features = {}
+        for name, edges in DRIFT_BINS.items():
+            features[name] = {'edges': edges, 'live': counts[name]}
+            if reference and name in reference:
+                features[name]['reference'] = reference[name]
+                features[name]['psi'] = population_stability_index(reference[name], counts[name]) if samples else None
+
+        scores = [feature['psi'] for feature in features.values() if feature.get('psi') is not None]
+        max_psi = max(scores) if scores else None
+        if not reference:
+            status = 'no reference'
+        elif samples < MIN_SAMPLES:
+            status = 'insufficient data'
+        elif max_psi >= PSI_SIGNIFICANT:
+            status = 'drift'
+        elif max_psi >= PSI_MODERATE:
+            status = 'moderate'
+        else:
+            status = 'stable'
+
+        return {
+            'samples': samples,
+            'status': status,
+            'max_psi': max_psi,
+            'drifted': sorted(name for name, feature in features.items()
+                              if (feature.get('psi') or 0) >= PSI_SIGNIFICANT),
+            'features': features,
+        }
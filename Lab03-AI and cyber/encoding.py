@@ -0,0 +1,56 @@
+import numpy as np
+
+
+class EncodingTable:
+    """A fitted LabelEncoder reduced to a plain label -> code lookup table.
+
+    Encoding one value is a single dict lookup instead of a round trip
+    through scikit-learn's array conversion and input checks. Unknown labels
+    raise the same ValueError that ``LabelEncoder.transform`` raises.
+    """
+
+    def __init__(self, classes):
+        # Encoders fitted on data with missing values carry a trailing NaN
+        # class, which is never a valid input
+        self.classes_ = np.array([label for label in classes if isinstance(label, str)], dtype=object)
+        self.codes = {label: code for code, label in enumerate(self.classes_)}
+        self._sorted_labels = np.array(sorted(self.codes), dtype=str)
+        self._sorted_codes = np.array([self.codes[label] for label in self._sorted_labels], dtype=np.int64)
+
+    @classmethod
+    def from_encoder(cls, encoder):
+        return cls(encoder.classes_)
+
+    def encode(self, label):
+        """Return the code for a single label."""
+        try:
+            return self.codes[label]
+        except (KeyError, TypeError):
+            raise _unseen(label) from None
+
+    def transform(self, values):
+        """Encode a list, NumPy array or pandas column of labels."""
+        values = np.asarray(values, dtype=object)
+        labels = values.astype(str)
+        # Binary search against the handful of known labels, then confirm
+        # each hit is an exact match
+        index = np.minimum(np.searchsorted(self._sorted_labels, labels), len(self._sorted_labels) - 1)
+        known = self._sorted_labels[index] == labels
+        if not known.all():
+            raise _unseen(values.ravel()[np.argmax(~known.ravel())])
+        return self._sorted_codes[index]
+
+
+def _unseen(label):
+    # Same wording as sklearn.preprocessing.LabelEncoder
+    return ValueError(f"y contains previously unseen labels: {KeyError(label)}")
+
+
+def build_tables(label_encoders):
+    """Plain lookup tables for a dict of fitted LabelEncoders."""
+    return {name: dict(EncodingTable.from_encoder(encoder).codes) for name, encoder in label_encoders.items()}
+
+
+def tables_to_encoders(tables):
+    """``EncodingTable`` objects for lookup tables saved with a model."""
+    return {name: EncodingTable(sorted(table, key=table.get)) for name, table in tables.items()}
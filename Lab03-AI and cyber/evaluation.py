@@ -0,0 +1,237 @@
+import html
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+from sklearn.inspection import permutation_importance
+from sklearn.metrics import accuracy_score, log_loss, roc_auc_score
+from sklearn.model_selection import StratifiedKFold
+
+from model import DEFAULT_ENGINE, FEATURES, load_and_preprocess_data, make_estimator
+
+# Defaults for `python model.py evaluate`
+FOLDS = 5
+IMPORTANCE_REPEATS = 5
+
+# Preprocessed matrix shared by the worker processes, set by _init_worker
+_data = None
+
+
+def _init_worker(data):
+    global _data
+    _data = data
+
+
+def _evaluate_fold(engine, fold, train_index, test_index, repeats, seed):
+    """Fit one engine on one fold; score it and its permutation importance on the held-out rows."""
+    X, y = _data
+    cpu_start = time.process_time()
+    start = time.perf_counter()
+    model = make_estimator(engine).fit(X[train_index], y[train_index])
+    fit_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    proba = model.predict_proba(X[test_index])
+    predicted = model.classes_.take(np.argmax(proba, axis=1))
+    probability = proba[:, 1]
+    score_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    importance = permutation_importance(model, X[test_index], y[test_index], scoring='accuracy',
+                                        n_repeats=repeats, random_state=seed + fold)
+    importance_seconds = time.perf_counter() - start
+    cpu_seconds = time.process_time() - cpu_start
+
+    return {
+        'engine': engine,
+        'fold': fold,
+        'test_rows': len(test_index),
+        'accuracy': float(accuracy_score(y[test_index], predicted)),
+        'roc_auc': float(roc_auc_score(y[test_index], probability)),
+        'log_loss': float(log_loss(y[test_index], probability, labels=[0, 1])),
+        # Accuracy lost when each feature is shuffled, one value per repeat
+        'importances': importance.importances.tolist(),
+        'fit_seconds': fit_seconds,
+        'score_seconds': score_seconds,
+        'importance_seconds': importance_seconds,
+        'cpu_seconds': cpu_seconds,
+    }
+
+
+def _summarize(values):
+    values = np.asarray(values, dtype=float)
+    return {'mean': float(values.mean()), 'std': float(values.std(ddof=1)) if len(values) > 1 else 0.0}
+
+
+def summarize_engine(folds):
+    """Mean and spread of every metric and feature importance over an engine's folds."""
+    importances = np.concatenate([np.asarray(fold['importances']) for fold in folds], axis=1)
+    return {
+        'accuracy': _summarize([fold['accuracy'] for fold in folds]),
+        'roc_auc': _summarize([fold['roc_auc'] for fold in folds]),
+        'log_loss': _summarize([fold['log_loss'] for fold in folds]),
+        'importance': {name: _summarize(values) for name, values in zip(FEATURES, importances)},
+        'fit_seconds': float(sum(fold['fit_seconds'] for fold in folds)),
+        'importance_seconds': float(sum(fold['importance_seconds'] for fold in folds)),
+    }
+
+
+def compare_engines(folds_a, folds_b):
+    """Paired comparison of two engines' accuracy on the same folds.
+
+    Returns the mean and spread of the per-fold differences and the paired
+    t statistic; a magnitude above about 2.8 (for 5 folds) is unlikely to be
+    chance at the 5% level.
+    """
+    difference = np.array([a['accuracy'] - b['accuracy'] for a, b in zip(folds_a, folds_b)])
+    summary = _summarize(difference)
+    stderr = summary['std'] / np.sqrt(len(difference))
+    summary['t'] = float(summary['mean'] / stderr) if stderr > 0 else None
+    return summary
+
+
+def evaluate_models(engines=(DEFAULT_ENGINE,), folds=FOLDS, repeats=IMPORTANCE_REPEATS, workers=None, seed=42,
+                    report_path='evaluation_report.json', html_path='evaluation_report.html'):
+    """Cross-validate engines and measure permutation feature importance across a process pool.
+
+    Every engine is scored on the same stratified folds, so their results
+    can be compared fold by fold. Each (engine, fold) pair is one task: fit
+    on the other folds, then score and permute features on the held-out
+    fold. The preprocessed matrix comes from the cache written by
+    ``load_and_preprocess_data`` and is sent to each worker once.
+    """
+    print("Loading and preprocessing data...")
+    X, y, _ = load_and_preprocess_data()
+    data = (np.asarray(X, dtype=float), np.asarray(y))
+    splits = list(StratifiedKFold(folds, shuffle=True, random_state=seed).split(*data))
+
+    tasks = [(engine, fold, train_index, test_index) for engine in engines
+             for fold, (train_index, test_index) in enumerate(splits)]
+    workers = workers or os.cpu_count()
+    print(f"Evaluating {len(engines)} engine(s) on {folds} folds with {workers} workers...")
+
+    start = time.perf_counter()
+    results = []
+    with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(data,)) as pool:
+        futures = [pool.submit(_evaluate_fold, *task, repeats, seed) for task in tasks]
+        for future in as_completed(futures):
+            result = future.result()
+            results.append(result)
+            print(f"  {result['engine']} fold {result['fold']}: accuracy {result['accuracy']:.4f}, "
+                  f"AUC {result['roc_auc']:.4f} ({result['fit_seconds'] + result['importance_seconds']:.1f}s)")
+    wall_seconds = time.perf_counter() - start
+
+    results.sort(key=lambda r: (list(engines).index(r['engine']), r['fold']))
+    by_engine = {engine: [r for r in results if r['engine'] == engine] for engine in engines}
+    cpu_seconds = sum(r['cpu_seconds'] for r in results)
+    report = {
+        'folds': folds,
+        'importance_repeats': repeats,
+        'rows': len(data[1]),
+        'features': FEATURES,
+        'timing': {
+            'wall_seconds': wall_seconds,
+            'cpu_seconds': cpu_seconds,
+            'workers': workers,
+            # CPU time the tasks needed over the time they took: above 1
+            # when the pool ran them side by side
+            'parallel_speedup': cpu_seconds / wall_seconds if wall_seconds else None,
+        },
+        'engines': {engine: summarize_engine(engine_folds) for engine, engine_folds in by_engine.items()},
+        'comparisons': [
+            dict(compare_engines(by_engine[a], by_engine[b]), engines=[a, b])
+            for i, a in enumerate(engines) for b in list(engines)[i + 1:]
+        ],
+        'fold_results': results,
+    }
+
+    with open(report_path, 'w') as f:
+        json.dump(report, f, indent=2)
+    with open(html_path, 'w') as f:
+        f.write(render_html(report))
+
+    print(f"\n{'engine':<10} {'accuracy':>16} {'ROC AUC':>16}")
+    for engine, summary in report['engines'].items():
+        print(f"{engine:<10} {summary['accuracy']['mean']:>9.4f} ± {summary['accuracy']['std']:.4f} "
+              f"{summary['roc_auc']['mean']:>9.4f} ± {summary['roc_auc']['std']:.4f}")
+    for comparison in report['comparisons']:
+        t = 'n/a' if comparison['t'] is None else f"{comparison['t']:.2f}"
+        print(f"{' - '.join(comparison['engines'])}: accuracy difference {comparison['mean']:+.4f} "
+              f"± {comparison['std']:.4f} (paired t {t})")
+    print(f"Evaluation took {wall_seconds:.1f}s ({cpu_seconds:.1f} CPU seconds on {workers} workers); "
+          f"reports written to {report_path} and {html_path}")
+    return report
+
+
+def render_html(report):
+    """A self-contained HTML page of an evaluation report."""
+    def row(cells, tag='td'):
+        return '<tr>' + ''.join(f'<{tag}>{html.escape(str(cell))}</{tag}>' for cell in cells) + '</tr>'
+
+    def spread(summary):
+        return f"{summary['mean']:.4f} ± {summary['std']:.4f}"
+
+    engines = report['engines']
+    metric_rows = [row(['Engine', 'Accuracy', 'ROC AUC', 'Log loss', 'Fit s', 'Importance s'], 'th')]
+    for engine, summary in engines.items():
+        metric_rows.append(row([engine, spread(summary['accuracy']), spread(summary['roc_auc']),
+                                spread(summary['log_loss']), f"{summary['fit_seconds']:.2f}",
+                                f"{summary['importance_seconds']:.2f}"]))
+
+    importance_rows = [row(['Feature'] + list(engines), 'th')]
+    largest = max([abs(s['importance'][name]['mean']) for s in engines.values() for name in report['features']]
+                  + [1e-12])
+    for name in report['features']:
+        cells = [f'<td>{html.escape(name)}</td>']
+        for summary in engines.values():
+            value = summary['importance'][name]
+            width = 100 * max(value['mean'], 0) / largest
+            cells.append(f'<td><div class="bar" style="width:{width:.0f}%"></div>{html.escape(spread(value))}</td>')
+        importance_rows.append('<tr>' + ''.join(cells) + '</tr>')
+
+    comparison_rows = [row(['Engines', 'Accuracy difference', 'Paired t'], 'th')]
+    for comparison in report['comparisons']:
+        comparison_rows.append(row([' - '.join(comparison['engines']), spread(comparison),
+                                    'n/a' if comparison['t'] is None else f"{comparison['t']:.2f}"]))
+
+    fold_rows = [row(['Engine', 'Fold', 'Rows', 'Accuracy', 'ROC AUC', 'Fit s', 'Importance s'], 'th')]
+    for result in report['fold_results']:
+        fold_rows.append(row([result['engine'], result['fold'], result['test_rows'], f"{result['accuracy']:.4f}",
+                              f"{result['roc_auc']:.4f}", f"{result['fit_seconds']:.2f}",
+                              f"{result['importance_seconds']:.2f}"]))
+
+    timing = report['timing']
+    comparisons = ''
+    if report['comparisons']:
+        comparisons = f"<h2>Engine comparison</h2><table>{''.join(comparison_rows)}</table>"
+    return f"""<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>Titanic model evaluation</title>
+<style>
+body {{ font-family: sans-serif; margin: 2em; }}
+table {{ border-collapse: collapse; margin-bottom: 2em; }}
+th, td {{ border: 1px solid #ccc; padding: 4px 10px; text-align: right; }}
+th:first-child, td:first-child {{ text-align: left; }}
+.bar {{ background: #4a90d9; height: 6px; margin-bottom: 2px; }}
+</style>
+</head>
+<body>
+<h1>Titanic model evaluation</h1>
+<p>{report['folds']}-fold stratified cross-validation on {report['rows']} rows; permutation importance with
+{report['importance_repeats']} repeats per fold (accuracy lost when the feature is shuffled).</p>
+<p>Took {timing['wall_seconds']:.1f}s for {timing['cpu_seconds']:.1f} CPU seconds of work on {timing['workers']}
+workers (speedup {timing['parallel_speedup']:.2f}x).</p>
+<h2>Cross-validation</h2>
+<table>{''.join(metric_rows)}</table>
+<h2>Permutation importance</h2>
+<table>{''.join(importance_rows)}</table>
+{comparisons}
+<h2>Folds</h2>
+<table>{''.join(fold_rows)}</table>
+</body>
+</html>
+"""
@@ -0,0 +1,243 @@
+import hashlib
+import json
+import os
+import shutil
+
+import numpy as np
+
+# Manifest inside a forest artifact directory; it is written last
+FOREST_MANIFEST = 'model.json'
+FOREST_ARRAYS = ['feature', 'threshold', 'left', 'right', 'value', 'roots']
+
+
+class FlatForest:
+    """A tree ensemble packed into flat node arrays for fast inference.
+
+    All trees share one set of arrays. Node ``i`` sends rows with
+    ``x[feature[i]] <= threshold[i]`` to ``left[i]`` and the rest to
+    ``right[i]``; ``value[i]`` is the class distribution at that node and
+    ``roots`` holds the first node of each tree. Leaves point back at
+    themselves, so a leaf is any node whose left child is itself.
+
+    ``predict_proba`` reproduces ``RandomForestClassifier.predict_proba``
+    exactly: inputs are compared as float32 like scikit-learn does, and the
+    per-tree distributions are summed in tree order before averaging.
+    """
+
+    def __init__(self, feature, threshold, left, right, value, roots, max_depth, classes):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.value = value
+        self.roots = roots
+        self.max_depth = int(max_depth)
+        self.classes_ = np.asarray(classes)
+        self._contribution_tables = {}
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    @property
+    def n_nodes(self):
+        return len(self.feature)
+
+    @property
+    def nbytes(self):
+        return sum(getattr(self, name).nbytes for name in FOREST_ARRAYS)
+
+    def apply(self, X):
+        """Return the leaf reached in every tree, shape (n_rows, n_trees)."""
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X[np.newaxis, :]
+        n_rows, n_features = X.shape
+
+        # Walk all (row, tree) pairs together, dropping pairs that reached a leaf
+        nodes = np.tile(self.roots, n_rows)
+        row_start = np.repeat(np.arange(n_rows) * n_features, self.n_trees)
+        flat_X = X.ravel()
+        active = np.arange(len(nodes))
+        for _ in range(self.max_depth):
+            current = nodes[active]
+            split = self.left[current] != current
+            if not split.all():
+                active = active[split]
+                current = current[split]
+                if not len(active):
+                    break
+            go_left = flat_X[row_start[active] + self.feature[current]] <= self.threshold[current]
+            nodes[active] = np.where(go_left, self.left[current], self.right[current])
+        return nodes.reshape(n_rows, self.n_trees)
+
+    def predict_proba(self, X):
+        """Return class probabilities averaged over all trees."""
+        leaves = self.apply(X)
+        # cumsum adds strictly in tree order, matching scikit-learn's loop
+        total = np.cumsum(self.value[leaves], axis=1)[:, -1]
+        return total / self.n_trees
+
+    def predict(self, X):
+        """Return the most probable class for each row."""
+        return self.classes_.take(np.argmax(self.predict_proba(X), axis=1))
+
+    def contribution_table(self, class_index=1):
+        """Per-node sum of each feature's contributions on the path from the root.
+
+        Row ``i`` holds, for every feature, how much the splits on that feature
+        between the tree's root and node ``i`` moved the probability of
+        ``class_index``. Built once, level by level, and kept in memory.
+        """
+        table = self._contribution_tables.get(class_index)
+        if table is not None:
+            return table
+
+        n_features = int(self.feature.max()) + 1 if self.n_nodes else 0
+        table = np.zeros((self.n_nodes, n_features))
+        value = np.asarray(self.value[:, class_index])
+        frontier = np.asarray(self.roots)
+        while len(frontier):
+            frontier = frontier[self.left[frontier] != frontier]
+            for children in (self.left[frontier], self.right[frontier]):
+                table[children] = table[frontier]
+                table[children, self.feature[frontier]] += value[children] - value[frontier]
+            frontier = np.concatenate([self.left[frontier], self.right[frontier]])
+        self._contribution_tables[class_index] = table
+        return table
+
+    def expected_value(self, class_index=1):
+        """Probability of ``class_index`` before any split: the mean over tree roots."""
+        return float(np.mean(self.value[self.roots, class_index]))
+
+    def explain(self, X, class_index=1, chunk_size=1024):
+        """Split each row's probability of ``class_index`` into per-feature parts.
+
+        Tree-interpreter style: every split on a row's decision path credits the
+        change in class probability to the split's feature. Returns ``(bias,
+        contributions)``, where ``bias`` is the forest's average root
+        probability and ``contributions`` has shape (n_rows, n_features);
+        ``bias + contributions.sum(axis=1)`` equals ``predict_proba`` up to
+        rounding.
+        """
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X[np.newaxis, :]
+        table = self.contribution_table(class_index)
+        bias = self.expected_value(class_index)
+
+        contributions = np.zeros((len(X), X.shape[1]))
+        n_features = table.shape[1]
+        # Gathering one table row per (row, tree) is the bulk of the work;
+        # chunking bounds that intermediate array for large batches
+        for start in range(0, len(X), chunk_size):
+            leaves = self.apply(X[start:start + chunk_size])
+            contributions[start:start + chunk_size, :n_features] = table[leaves].sum(axis=1) / self.n_trees
+        return bias, contributions
+
+
+def export_forest(model):
+    """Pack a fitted scikit-learn tree ensemble into a ``FlatForest``."""
+    trees = [estimator.tree_ for estimator in model.estimators_]
+    sizes = [tree.node_count for tree in trees]
+    offsets = np.concatenate([[0], np.cumsum(sizes)[:-1]]).astype(np.int32)
+    n_nodes = int(sum(sizes))
+    n_classes = len(model.classes_)
+
+    feature = np.zeros(n_nodes, dtype=np.int32)
+    threshold = np.zeros(n_nodes)
+    left = np.arange(n_nodes, dtype=np.int32)
+    right = np.arange(n_nodes, dtype=np.int32)
+    value = np.empty((n_nodes, n_classes))
+
+    for tree, offset, size in zip(trees, offsets, sizes):
+        nodes = slice(offset, offset + size)
+        split = tree.children_left != -1
+
+        feature[nodes][split] = tree.feature[split]
+        threshold[nodes][split] = tree.threshold[split]
+        left[nodes][split] = tree.children_left[split] + offset
+        right[nodes][split] = tree.children_right[split] + offset
+
+        # Same normalisation as DecisionTreeClassifier.predict_proba
+        distribution = tree.value[:, 0, :n_classes].copy()
+        normalizer = distribution.sum(axis=1)[:, np.newaxis]
+        normalizer[normalizer == 0.0] = 1.0
+        value[nodes] = distribution / normalizer
+
+    return FlatForest(
+        feature=feature,
+        threshold=threshold,
+        left=left,
+        right=right,
+        value=value,
+        roots=offsets,
+        max_depth=max(tree.max_depth for tree in trees),
+        classes=model.classes_,
+    )
+
+
+def save_forest(forest, path, metadata=None, arrays=None):
+    """Write a forest as a directory of raw ``.npy`` arrays.
+
+    The arrays can be opened with ``mmap_mode``, so every process serving
+    the model maps the same read-only pages instead of holding a private
+    copy. ``metadata`` (JSON-serializable) is stored in the manifest with a
+    checksum of the arrays. Extra NumPy ``arrays`` saved with the model are
+    stored and checksummed the same way. The directory is built beside
+    ``path`` and renamed into place, so readers never see a partial artifact.
+    """
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+
+    digest = hashlib.sha256()
+    for name in FOREST_ARRAYS:
+        array = np.ascontiguousarray(getattr(forest, name))
+        np.save(os.path.join(tmp_path, f'{name}.npy'), array)
+        digest.update(array.tobytes())
+    for name, array in (arrays or {}).items():
+        array = np.ascontiguousarray(array)
+        np.save(os.path.join(tmp_path, f'extra-{name}.npy'), array)
+        digest.update(array.tobytes())
+
+    manifest = {
+        'format': 'flat-forest',
+        'version': 1,
+        'max_depth': forest.max_depth,
+        'classes': forest.classes_.tolist(),
+        'sha256': digest.hexdigest(),
+        'metadata': metadata or {},
+        'arrays': sorted(arrays or {}),
+    }
+    with open(os.path.join(tmp_path, FOREST_MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+    old_path = f"{path}.old-{os.getpid()}"
+    if os.path.exists(path):
+        os.rename(path, old_path)
+    os.rename(tmp_path, path)
+    # Processes that mapped the old arrays keep them until they let go
+    shutil.rmtree(old_path, ignore_errors=True)
+
+
+def load_forest(path, mmap_mode='r'):
+    """Open a forest saved by ``save_forest``; returns ``(forest, metadata)``."""
+    with open(os.path.join(path, FOREST_MANIFEST)) as f:
+        manifest = json.load(f)
+    if manifest.get('format') != 'flat-forest':
+        raise ValueError(f"{path} is not a flat forest artifact")
+
+    arrays = {
+        name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode=mmap_mode)
+        for name in FOREST_ARRAYS
+    }
+    forest = FlatForest(max_depth=manifest['max_depth'], classes=manifest['classes'], **arrays)
+    metadata = manifest['metadata']
+    if manifest.get('arrays'):
+        # Extra arrays come back under 'arrays' in the metadata
+        metadata = dict(metadata, arrays={
+            name: np.load(os.path.join(path, f'extra-{name}.npy'), mmap_mode=mmap_mode)
+            for name in manifest['arrays']
+        })
+    return forest, metadata
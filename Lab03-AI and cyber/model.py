@@ -1,20 +1,175 @@
-import pandas as pd
+import argparse
+import gc
+import hashlib
+import importlib
+import io
+import json
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque, namedtuple
+
 import numpy as np
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.model_selection import train_test_split
-from sklearn.preprocessing import LabelEncoder
-import joblib
-import seaborn as sns
+
+# pandas, scikit-learn, seaborn and joblib are imported inside the functions
+# that need them. Serving a '.forest' artifact then only loads NumPy, which
+# keeps worker cold starts short.
+
+from encoding import EncodingTable, build_tables, tables_to_encoders
+from forest import FOREST_MANIFEST, FlatForest, export_forest, load_forest, save_forest
+from prediction_cache import PredictionCache
+from survival_table import TOLERANCE, SurvivalTable, build_survival_table
+
+
+MODEL_PATH = 'titanic_model.pkl'
+
+# Served by the app; point it at a '.forest' directory to share one
+# memory-mapped copy of the model between worker processes
+SERVING_MODEL_PATH = os.environ.get('TITANIC_MODEL_PATH', MODEL_PATH)
+
+FEATURES = ['pclass', 'sex', 'age', 'sibsp', 'parch', 'fare', 'embarked']
+TARGET = 'survived'
+
+# Local copy of the training data, so training works without network access
+DATA_DIR = 'data'
+DATASET_PATH = os.path.join(DATA_DIR, 'titanic.npz')
+DATASET_MANIFEST = os.path.join(DATA_DIR, 'titanic.json')
+
+# Bump when load_and_preprocess_data changes, to invalidate cached matrices
+PREPROCESS_VERSION = 1
+
+# Estimators train_model can fit, as (module, class, parameters); the module
+# is imported only when that engine is trained
+ENGINES = {
+    'forest': ('sklearn.ensemble', 'RandomForestClassifier', {'n_estimators': 100, 'random_state': 42}),
+    'hist-gb': ('sklearn.ensemble', 'HistGradientBoostingClassifier', {'random_state': 42}),
+}
+DEFAULT_ENGINE = 'forest'
+
+# Rows scored per predict_proba call in batch mode
+BATCH_CHUNK_SIZE = 10000
+# Most points a what-if sweep may ask for
+SWEEP_MAX_POINTS = 1000
+
+# Up to this many rows the flat NumPy forest beats scikit-learn's per-call
+# overhead; larger batches go to scikit-learn's compiled tree walk
+FLAT_FOREST_MAX_ROWS = 256
+
+# Inputs are compared as float32 by the trees, so anything larger (or not
+# finite) cannot be scored
+MAX_INPUT_VALUE = float(np.finfo(np.float32).max)
+# Largest sibsp or parch accepted; the passenger list tops out at 8
+MAX_RELATIVES = 20
+
+# Background training of a missing model is tried this many times, waiting
+# BOOTSTRAP_BACKOFF seconds after the first failure and twice as long after
+# each one after that
+BOOTSTRAP_ATTEMPTS = 3
+BOOTSTRAP_BACKOFF = 5.0
+
+# Distinct passengers remembered by predict_survival
+PREDICTION_CACHE_SIZE = 4096
+
+
+def _dataset_checksum(arrays):
+    """SHA-256 over the column names, dtypes and contents of a dataset."""
+    digest = hashlib.sha256()
+    for name in sorted(arrays):
+        array = np.ascontiguousarray(arrays[name])
+        digest.update(f"{name}:{array.dtype.str}:{array.shape};".encode())
+        digest.update(array.tobytes())
+    return digest.hexdigest()
+
+
+def save_dataset(df, source):
+    """Store the raw training columns as a local NumPy archive.
+
+    Text columns are saved as fixed-width strings with a separate missing
+    mask, so the archive loads without pickle. The checksum and provenance
+    are recorded in ``DATASET_MANIFEST``.
+    """
+    import pandas as pd
+
+    arrays = {}
+    for name in FEATURES + [TARGET]:
+        column = df[name]
+        if pd.api.types.is_numeric_dtype(column):
+            arrays[name] = column.to_numpy()
+        else:
+            missing = column.isna().to_numpy()
+            arrays[name] = np.where(missing, '', column.astype(str).to_numpy()).astype(str)
+            arrays[f'{name}__missing'] = missing
+
+    checksum = _dataset_checksum(arrays)
+    os.makedirs(DATA_DIR, exist_ok=True)
+    np.savez_compressed(DATASET_PATH, **arrays)
+    with open(DATASET_MANIFEST, 'w') as f:
+        json.dump({'source': source, 'rows': len(df), 'sha256': checksum}, f, indent=2)
+    print(f"Dataset saved to {DATASET_PATH} ({len(df)} rows, sha256 {checksum[:12]})")
+    return checksum
 
 
-def load_and_preprocess_data():
-    """Load Titanic dataset and preprocess it."""
-    # Load Titanic dataset from seaborn
-    df = sns.load_dataset('titanic')
+def fetch_dataset(csv_path=None):
+    """Populate the local dataset from seaborn, or from a CSV copy of it."""
+    import pandas as pd
+    import seaborn as sns
+
+    if csv_path:
+        return save_dataset(pd.read_csv(csv_path), csv_path)
+    return save_dataset(sns.load_dataset('titanic'), 'seaborn:titanic')
+
+
+def load_raw_dataset():
+    """Return the raw training columns and their checksum.
+
+    Reads the local archive, downloading it once through seaborn if it does
+    not exist yet. Raises ValueError if the archive does not match the
+    checksum recorded when it was saved.
+    """
+    import pandas as pd
+
+    if not os.path.exists(DATASET_PATH):
+        fetch_dataset()
+
+    with np.load(DATASET_PATH) as archive:
+        arrays = {name: archive[name] for name in archive.files}
+    with open(DATASET_MANIFEST) as f:
+        manifest = json.load(f)
+
+    checksum = _dataset_checksum(arrays)
+    if checksum != manifest['sha256']:
+        raise ValueError(
+            f"{DATASET_PATH} does not match its recorded checksum; "
+            f"re-create it with 'python model.py fetch-data'"
+        )
+
+    columns = {}
+    for name in FEATURES + [TARGET]:
+        column = arrays[name]
+        if f'{name}__missing' in arrays:
+            column = pd.Series(column, dtype=object).mask(arrays[f'{name}__missing'])
+        columns[name] = column
+    return pd.DataFrame(columns), checksum
+
+
+def load_and_preprocess_data(use_cache=True):
+    """Load Titanic dataset and preprocess it.
+
+    The result is cached in ``DATA_DIR`` keyed on the dataset checksum, so
+    repeated training runs skip the pandas preprocessing entirely.
+    """
+    import joblib
+    from sklearn.preprocessing import LabelEncoder
+
+    df, checksum = load_raw_dataset()
+    cache_path = os.path.join(DATA_DIR, f'preprocessed-v{PREPROCESS_VERSION}-{checksum[:16]}.joblib')
+    if use_cache and os.path.exists(cache_path):
+        return joblib.load(cache_path)
 
     # Select relevant features
-    features = ['pclass', 'sex', 'age', 'sibsp', 'parch', 'fare', 'embarked']
-    target = 'survived'
+    features = FEATURES
+    target = TARGET
 
     # Create a copy with selected columns
     data = df[features + [target]].copy()
@@ -40,11 +195,53 @@ def load_and_preprocess_data():
     X = data[features]
     y = data[target]
 
+    if use_cache:
+        joblib.dump((X, y, label_encoders), cache_path)
+
     return X, y, label_encoders
 
 
-def train_model():
-    """Train the classification model and save it."""
+def make_estimator(engine=DEFAULT_ENGINE):
+    """A fresh, unfitted estimator for one of ``ENGINES``."""
+    try:
+        module, name, params = ENGINES[engine]
+    except KeyError:
+        raise ValueError(f"Unknown engine {engine!r}; choose from {', '.join(ENGINES)}") from None
+    return getattr(importlib.import_module(module), name)(**params)
+
+
+def train_model(path=MODEL_PATH, register=False, compact=False, max_depth=None,
+                report_path='compaction_report.json', engine=DEFAULT_ENGINE, survival_table=False,
+                table_tolerance=TOLERANCE, table_grids=None):
+    """Train the classification model and save it.
+
+    ``engine`` names the estimator in ``ENGINES``. Every engine is saved in
+    the same artifact format and served through ``load_model`` and
+    ``predict_survival``; forests are also exported to the flat '.forest'
+    format.
+
+    With ``register=True`` the model is also added to the model registry as
+    a new version, with its accuracy recorded in the version's metadata.
+
+    With ``compact=True`` a quarter of the training rows is held out, and the
+    fitted forest is cut to ``max_depth`` and stripped of trees that do not
+    help accuracy on them (see ``compaction.py``). The compact ``FlatForest``
+    is saved instead, and a before/after report is written to ``report_path``.
+
+    With ``survival_table=True`` the final model is also scored over a grid
+    of age and fare buckets (see ``survival_table.py``) and the table is
+    saved in the artifact, so predictions that land in a bucket where the
+    forest is flat to within ``table_tolerance`` are a single lookup.
+    ``table_grids`` may override the ``age_grid`` and ``fare_grid``.
+    """
+    from sklearn.model_selection import train_test_split
+
+    if compact and engine != 'forest':
+        raise ValueError("Only the forest engine can be compacted")
+    if survival_table and engine != 'forest':
+        raise ValueError("Only the forest engine can have a survival table")
+    estimator = make_estimator(engine)
+
     print("Loading and preprocessing data...")
     X, y, label_encoders = load_and_preprocess_data()
 
@@ -53,10 +250,15 @@ def train_model():
         X, y, test_size=0.2, random_state=42
     )
 
-    # Train RandomForest classifier
-    print("Training RandomForest classifier...")
-    model = RandomForestClassifier(n_estimators=100, random_state=42)
-    model.fit(X_train, y_train)
+    if compact:
+        # Rows for choosing which trees to keep, unseen by the forest
+        X_train, X_val, y_train, y_val = train_test_split(
+            X_train, y_train, test_size=0.25, random_state=42
+        )
+
+    # Train the classifier
+    print(f"Training {type(estimator).__name__}...")
+    model = estimator.fit(X_train, y_train)
 
     # Evaluate
     train_score = model.score(X_train, y_train)
@@ -64,43 +266,774 @@ def train_model():
     print(f"Training accuracy: {train_score:.4f}")
     print(f"Test accuracy: {test_score:.4f}")
 
-    # Save model and encoders
+    if compact:
+        from compaction import COMPACT_MAX_DEPTH, compact_model
+        model, report = compact_model(model, X_val, y_val, X_test, y_test,
+                                      max_depth or COMPACT_MAX_DEPTH, report_path=report_path)
+        test_score = report['after']['accuracy']
+
+    from drift import reference_histograms
+    drift_reference = reference_histograms(X_train)
+
+    table = None
+    if survival_table:
+        table = build_survival_table(model, label_encoders, tolerance=table_tolerance, **(table_grids or {}))
+
+    save_model(model, label_encoders, path, drift_reference, table)
+    if register:
+        from registry import register_model
+        register_model(model, label_encoders, {'train_accuracy': train_score, 'test_accuracy': test_score},
+                       drift_reference=drift_reference, survival_table=table)
+
+    return model, label_encoders
+
+
+def bootstrap_model(path=MODEL_PATH):
+    """Train the artifact at ``path`` unless it exists, at most once per host.
+
+    Every caller takes an exclusive lock on ``<path>.lock`` first, so when
+    several worker processes start without a model one of them trains while
+    the others wait and then find the finished artifact. For a '.forest'
+    path the pickle next to it is trained, which writes the forest as well.
+    """
+    import fcntl
+
+    base = path.rstrip(os.sep)
+    with open(base + '.lock', 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            if os.path.exists(path):
+                return False
+            print(f"Model {path} not found. Training new model...")
+            train_model(os.path.splitext(base)[0] + '.pkl' if base.endswith('.forest') else path)
+            return True
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def save_model(model, label_encoders, path=MODEL_PATH, drift_reference=None, survival_table=None):
+    """Save a fitted model and its encoders as a model artifact.
+
+    ``drift_reference`` holds histograms of the training inputs (see
+    ``drift.reference_histograms``) for monitoring live traffic, and
+    ``survival_table`` an optional ``SurvivalTable`` of precomputed answers.
+    """
+    import joblib
+    from sklearn.ensemble import RandomForestClassifier
+
     model_data = {
         'model': model,
-        'label_encoders': label_encoders
+        'label_encoders': label_encoders,
+        # Plain dicts used for encoding at serving time
+        'encoding_tables': build_tables(label_encoders),
+        'drift_reference': drift_reference,
     }
-    joblib.dump(model_data, 'titanic_model.pkl')
-    print("Model saved to titanic_model.pkl")
+    if survival_table is not None:
+        model_data['survival_table'], probability = survival_table.to_artifact()
+        model_data['arrays'] = {'survival_table': probability}
+    # Write to a temporary file and rename it into place so a running app
+    # never picks up a half-written artifact
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    joblib.dump(model_data, tmp_path)
+    os.replace(tmp_path, path)
+    print(f"Model saved to {path}")
+
+    if isinstance(model, (FlatForest, RandomForestClassifier)):
+        export_model(model, label_encoders, forest_path_for(path), drift_reference, survival_table)
+
+
+def forest_path_for(path):
+    """The memory-mappable artifact written alongside a pickled model."""
+    return os.path.splitext(path)[0] + '.forest'
+
+
+def export_model(model, label_encoders, path, drift_reference=None, survival_table=None):
+    """Save a fitted forest as a memory-mappable '.forest' directory."""
+    metadata = {
+        'features': FEATURES,
+        'encoding_tables': build_tables(label_encoders),
+        'drift_reference': drift_reference,
+    }
+    arrays = {}
+    if survival_table is not None:
+        metadata['survival_table'], arrays['survival_table'] = survival_table.to_artifact()
+    forest = model if isinstance(model, FlatForest) else export_forest(model)
+    save_forest(forest, path, metadata, arrays)
+    print(f"Memory-mappable model saved to {path}")
 
-    return model, label_encoders
 
+def _encoding_tables(model_data):
+    """``EncodingTable`` objects for a loaded artifact, old or new."""
+    if 'encoding_tables' in model_data:
+        return tables_to_encoders(model_data['encoding_tables'])
+    # Artifacts saved before lookup tables were stored hold fitted encoders
+    # (pickles) or their class lists (early '.forest' manifests)
+    return {
+        name: EncodingTable(getattr(encoder, 'classes_', encoder))
+        for name, encoder in model_data['label_encoders'].items()
+    }
+
+
+def _survival_table(model_data):
+    """The ``SurvivalTable`` saved in an artifact, or None."""
+    spec = model_data.get('survival_table')
+    if spec is None:
+        return None
+    return SurvivalTable.from_artifact(spec, model_data['arrays']['survival_table'])
+
+
+def load_model(path=MODEL_PATH):
+    """Load the trained model from file.
 
-def load_model():
-    """Load the trained model from file."""
-    model_data = joblib.load('titanic_model.pkl')
+    ``path`` may be a pickled artifact or a '.forest' directory, which is
+    memory-mapped read-only and returns a ``FlatForest`` as the model with
+    ``EncodingTable`` encoders.
+    """
+    if os.path.isdir(path):
+        forest, metadata = load_forest(path)
+        return forest, _encoding_tables(metadata)
+
+    import joblib
+    model_data = joblib.load(path)
     return model_data['model'], model_data['label_encoders']
 
 
-def predict_survival(pclass, sex, age, sibsp, parch, fare, embarked):
-    """Make a prediction for a single passenger."""
-    model, label_encoders = load_model()
+class ModelNotReady(Exception):
+    """Raised when no model has been loaded yet because the artifact is still being trained."""
+
+
+class ModelBootstrapFailed(ModelNotReady):
+    """Raised when the model is missing and every attempt to train it has failed."""
+
+
+LoadedModel = namedtuple(
+    'LoadedModel',
+    ['model', 'forest', 'label_encoders', 'generation', 'sha256', 'mtime', 'load_seconds', 'loaded_at',
+     'drift_reference', 'survival_table'],
+    defaults=[None, None],
+)
+
+
+class ModelHolder:
+    """Keep one deserialized model resident for the whole process.
+
+    The artifact is loaded on first use. Afterwards ``get()`` stats the file at
+    most once per ``check_interval`` seconds; when its mtime or size changes the
+    file is hashed and, if the content differs, loaded off to the side and
+    swapped in with a single reference assignment. Requests that already hold
+    the previous ``LoadedModel`` finish with it undisturbed. For a '.forest'
+    directory the manifest, which carries a checksum of the arrays, is watched.
+    """
+
+    def __init__(self, path=SERVING_MODEL_PATH, check_interval=1.0):
+        self.path = path
+        self.check_interval = check_interval
+        self.reloads = 0
+        self.last_error = None
+        self.bootstrap_failed = False
+        self._current = None
+        self._signature = None
+        self._last_check = 0.0
+        self._lock = threading.Lock()
+
+    def bootstrap(self, attempts=BOOTSTRAP_ATTEMPTS, backoff=BOOTSTRAP_BACKOFF):
+        """Train the missing artifact in a background thread; ``get()`` picks it up when saved.
+
+        A failed attempt is retried after ``backoff`` seconds, doubling each
+        time. Once all ``attempts`` have failed, ``get()`` raises
+        ``ModelBootstrapFailed`` instead of asking callers to retry.
+        """
+        self.bootstrap_failed = False
+        thread = threading.Thread(target=self._bootstrap, args=(attempts, backoff), name='model-bootstrap',
+                                  daemon=True)
+        thread.start()
+        return thread
+
+    def _bootstrap(self, attempts, backoff):
+        for attempt in range(attempts):
+            try:
+                bootstrap_model(self.path)
+                self.get()
+                return
+            except Exception as e:
+                self.last_error = f"Model bootstrap failed: {e}"
+                print(f"{self.last_error} (attempt {attempt + 1} of {attempts})")
+            if attempt + 1 < attempts:
+                time.sleep(backoff * 2 ** attempt)
+        self.bootstrap_failed = True
+
+    def get(self):
+        """Return the current ``LoadedModel``, reloading it if the file changed."""
+        current = self._current
+        if current is None or time.monotonic() - self._last_check >= self.check_interval:
+            current = self._refresh()
+        return current
+
+    def _refresh(self):
+        with self._lock:
+            self._last_check = time.monotonic()
+            current = self._current
+            try:
+                watched = self.path
+                if os.path.isdir(watched):
+                    watched = os.path.join(watched, FOREST_MANIFEST)
+                stat = os.stat(watched)
+                signature = (stat.st_mtime_ns, stat.st_size)
+                if current is not None and signature == self._signature:
+                    return current
+
+                with open(watched, 'rb') as f:
+                    data = f.read()
+                digest = hashlib.sha256(data).hexdigest()
+                if current is None or digest != current.sha256:
+                    current = self._load(data, digest, stat.st_mtime)
+                self._signature = signature
+                self.last_error = None
+                return current
+            except Exception as e:
+                # Keep serving the model we already have if a reload fails
+                if current is None:
+                    if isinstance(e, FileNotFoundError):
+                        if self.bootstrap_failed:
+                            raise ModelBootstrapFailed(self.last_error) from e
+                        raise ModelNotReady(f"Model {self.path} is not available yet") from e
+                    raise
+                self.last_error = str(e)
+                return current
+
+    def _load(self, data, digest, mtime):
+        start = time.perf_counter()
+        if os.path.isdir(self.path):
+            model, model_data = load_forest(self.path)
+        else:
+            import joblib
+
+            # Unpickle the bytes that were hashed, not whatever is on disk now
+            model_data = joblib.load(io.BytesIO(data))
+            model = model_data['model']
+        label_encoders = _encoding_tables(model_data)
+
+        if isinstance(model, FlatForest):
+            forest = model
+        else:
+            # Already imported by unpickling the model
+            from sklearn.ensemble import RandomForestClassifier
+            forest = export_forest(model) if isinstance(model, RandomForestClassifier) else None
+        load_seconds = time.perf_counter() - start
+
+        generation = 1 if self._current is None else self._current.generation + 1
+        loaded = LoadedModel(
+            model=model,
+            forest=forest,
+            label_encoders=label_encoders,
+            generation=generation,
+            sha256=digest,
+            mtime=mtime,
+            load_seconds=load_seconds,
+            loaded_at=time.time(),
+            # Training-data histograms for the drift monitor, if saved
+            drift_reference=model_data.get('drift_reference'),
+            survival_table=_survival_table(model_data),
+        )
+        if self._current is not None:
+            self.reloads += 1
+        self._current = loaded
+        return loaded
+
+    def stats(self):
+        """Describe the resident model for health checks and monitoring."""
+        current = self._current
+        return {
+            'path': self.path,
+            'loaded': current is not None,
+            'generation': current.generation if current else None,
+            'sha256': current.sha256 if current else None,
+            'mtime': current.mtime if current else None,
+            'load_seconds': current.load_seconds if current else None,
+            'loaded_at': current.loaded_at if current else None,
+            'reloads': self.reloads,
+            'bootstrap_failed': self.bootstrap_failed,
+            'last_error': self.last_error,
+        }
+
+
+# Shared by every request in this process
+model_holder = ModelHolder()
+prediction_cache = PredictionCache(PREDICTION_CACHE_SIZE)
+
+
+def predict_survival(pclass, sex, age, sibsp, parch, fare, embarked, explain=False):
+    """Make a prediction for a single passenger.
+
+    With ``explain=True`` the result also carries ``bias`` and per-feature
+    ``contributions`` that add up to the probability (see ``explain_rows``).
+    """
+    loaded = model_holder.get()
+    features = encode_features(loaded, pclass, sex, age, sibsp, parch, fare, embarked)
+    return predict_encoded(loaded, features, explain)
+
+
+def encode_features(loaded, pclass, sex, age, sibsp, parch, fare, embarked):
+    """Encode one validated passenger into a feature tuple in ``FEATURES`` order."""
+    label_encoders = loaded.label_encoders
 
     # Encode categorical inputs
-    sex_encoded = label_encoders['sex'].transform([sex])[0]
-    embarked_encoded = label_encoders['embarked'].transform([embarked])[0]
+    sex_encoded = label_encoders['sex'].encode(sex)
+    embarked_encoded = label_encoders['embarked'].encode(embarked)
+
+    return (float(pclass), float(sex_encoded), float(age), float(sibsp),
+            float(parch), float(fare), float(embarked_encoded))
+
+
+def predict_encoded(loaded, features, explain=False, cache=None):
+    """Predict for one encoded feature tuple, answering repeats from the cache.
+
+    Models saved with a survival table answer inputs that land in one of its
+    buckets from the table; explanations always come from the model.
+    ``cache`` defaults to the cache of the resident model; models loaded
+    from elsewhere, such as the registry, must bring their own.
+    """
+    cache = cache or prediction_cache
+    cached = lookup_survival_table(loaded, features) if not explain else None
+    if cached is None:
+        cached = cache.get(loaded.generation, features)
+        if cached is None:
+            survived, probability = _score(loaded, np.array([features]))
+            cached = (bool(survived[0]), float(probability[0]))
+            cache.put(loaded.generation, features, cached)
+
+    result = {
+        'survived': cached[0],
+        'probability': cached[1]
+    }
+    if explain:
+        bias, contributions = explain_rows(loaded, np.array([features]))
+        result.update(_explanation(bias, contributions[0]))
+    return result
+
+
+def lookup_survival_table(loaded, features):
+    """``(survived, probability)`` from the model's survival table, or None to score it."""
+    if loaded.survival_table is None:
+        return None
+    return loaded.survival_table.lookup(features)
+
+
+def explain_rows(loaded, X):
+    """Split the survival probability of encoded rows into feature contributions.
 
-    # Create feature array
-    features = np.array([[pclass, sex_encoded, age, sibsp, parch, fare, embarked_encoded]])
+    Walks every tree's decision path once for all rows and credits each
+    split's change in survival probability to the feature it tested.
+    Returns ``(bias, contributions)``: the forest's base rate and an array
+    of shape (n_rows, n_features) in ``FEATURES`` order.
+    """
+    return _explaining_forest(loaded).explain(X, class_index=1)
 
-    # Make prediction
-    prediction = model.predict(features)[0]
-    probability = model.predict_proba(features)[0]
 
+def _explaining_forest(loaded):
+    if loaded.forest is None:
+        raise ValueError("Explanations are only available for random forest models")
+    return loaded.forest
+
+
+def _explanation(bias, contributions):
     return {
-        'survived': bool(prediction),
-        'probability': float(probability[1])
+        'bias': bias,
+        'contributions': {name: float(value) for name, value in zip(FEATURES, contributions)},
     }
 
 
+def encode_passenger(record, loaded=None):
+    """Validate one passenger record and return its encoded feature row.
+
+    Raises ValueError with the same message the batch endpoint reports.
+    """
+    loaded = loaded or model_holder.get()
+    X, errors = validate_batch([record], loaded.label_encoders)
+    if errors[0] is not None:
+        raise ValueError(errors[0])
+    return X[0]
+
+
+def predict_rows(X):
+    """Score encoded feature rows with the resident model in one call."""
+    survived, probability = _score(model_holder.get(), X)
+    return [{'survived': bool(s), 'probability': float(p)} for s, p in zip(survived, probability)]
+
+
+def _numeric_column(values, name, errors):
+    """Convert a column to floats, recording rows that are not numbers."""
+    try:
+        # Fast path: the whole column parses in one NumPy call
+        column = np.asarray(values, dtype=float)
+    except (TypeError, ValueError):
+        column = np.empty(len(values))
+        for i, value in enumerate(values):
+            try:
+                column[i] = float(value)
+            except (TypeError, ValueError):
+                column[i] = np.nan
+                if errors[i] is None:
+                    errors[i] = f"{name} must be a number"
+    return column
+
+
+def _flag(errors, mask, message):
+    """Record ``message`` for every row in ``mask`` that has no error yet."""
+    for i in np.flatnonzero(mask):
+        if errors[i] is None:
+            errors[i] = message
+
+
+def _rows_to_columns(rows):
+    """Split passenger records into columns, flagging rows that are not mappings."""
+    errors = [None] * len(rows)
+    for i, row in enumerate(rows):
+        if not isinstance(row, dict):
+            errors[i] = "Row must be an object with passenger fields"
+    records = [row if isinstance(row, dict) else {} for row in rows]
+    columns = {name: [row.get(name) for row in records] for name in FEATURES}
+    return columns, errors
+
+
+def validate_batch(rows, label_encoders):
+    """Validate and encode a batch of passenger records.
+
+    Returns the feature matrix and a list holding an error message (or None)
+    for each row. Matrix rows with an error are left as zeros and must not be
+    scored.
+    """
+    columns, errors = _rows_to_columns(rows)
+    return validate_columns(columns, label_encoders, errors)
+
+
+def validate_columns(columns, label_encoders, errors=None):
+    """Validate and encode passenger data given column-wise.
+
+    ``columns`` maps each name in ``FEATURES`` to a sequence of raw values,
+    such as a list or a column of a pandas chunk read with ``dtype=str``.
+    Returns the same ``(X, errors)`` pair as ``validate_batch``.
+    """
+    n = len(columns[FEATURES[0]])
+    if errors is None:
+        errors = [None] * n
+
+    for name in FEATURES:
+        for i, value in enumerate(columns[name]):
+            if (value is None or value == '') and errors[i] is None:
+                errors[i] = f"Missing field: {name}"
+
+    pclass = _numeric_column(columns['pclass'], 'pclass', errors)
+    age = _numeric_column(columns['age'], 'age', errors)
+    sibsp = _numeric_column(columns['sibsp'], 'sibsp', errors)
+    parch = _numeric_column(columns['parch'], 'parch', errors)
+    fare = _numeric_column(columns['fare'], 'fare', errors)
+    sex = np.array([str(value) for value in columns['sex']], dtype=object)
+    embarked = np.array([str(value) for value in columns['embarked']], dtype=object)
+
+    # Same rules, in the same order, as the single-passenger form
+    with np.errstate(invalid='ignore'):
+        _flag(errors, (np.mod(sibsp, 1) != 0) | (np.mod(parch, 1) != 0), "SibSp and Parch must be whole numbers")
+        _flag(errors, ~np.isin(pclass, [1, 2, 3]), "Pclass must be 1, 2, or 3")
+        _flag(errors, ~np.isin(sex, ['male', 'female']), "Sex must be 'male' or 'female'")
+        _flag(errors, ~(np.abs(age) <= MAX_INPUT_VALUE), "Age must be a finite number")
+        _flag(errors, ~((age >= 0) & (age <= 120)), "Age must be between 0 and 120")
+        _flag(errors, ~(sibsp >= 0), "SibSp must be non-negative")
+        _flag(errors, ~(parch >= 0), "Parch must be non-negative")
+        _flag(errors, ~((sibsp <= MAX_RELATIVES) & (parch <= MAX_RELATIVES)),
+              f"SibSp and Parch must be at most {MAX_RELATIVES}")
+        _flag(errors, ~(np.abs(fare) <= MAX_INPUT_VALUE), "Fare must be a finite number")
+        _flag(errors, ~(fare >= 0), "Fare must be non-negative")
+        _flag(errors, ~np.isin(embarked, ['C', 'Q', 'S']), "Embarked must be 'C', 'Q', or 'S'")
+
+    valid = np.array([error is None for error in errors], dtype=bool)
+    X = np.zeros((n, len(FEATURES)))
+    if valid.any():
+        X[valid] = np.column_stack([
+            pclass[valid],
+            label_encoders['sex'].transform(sex[valid]),
+            age[valid],
+            sibsp[valid],
+            parch[valid],
+            fare[valid],
+            label_encoders['embarked'].transform(embarked[valid]),
+        ])
+    return X, errors
+
+
+def _score(loaded, X):
+    """Score a feature matrix with a single predict_proba call."""
+    use_forest = loaded.forest is not None and len(X) <= FLAT_FOREST_MAX_ROWS
+    model = loaded.forest if use_forest else loaded.model
+    probability = model.predict_proba(X)
+    survived = model.classes_.take(np.argmax(probability, axis=1))
+    return survived.astype(bool), probability[:, 1]
+
+
+def score_columns(loaded, columns, errors=None, chunk_size=BATCH_CHUNK_SIZE, explain=False, on_scored=None):
+    """Validate, encode and score column-wise passenger data.
+
+    Returns ``(survived, probability, errors)``; entries for rows with an
+    error are False and 0.0. With ``explain=True`` a fourth item holds the
+    per-feature contributions from ``explain_rows`` (zero for error rows).
+    ``on_scored(X, survived, probability)`` is called once with the encoded
+    rows that were scored, for example to log them.
+    """
+    X, errors = validate_columns(columns, loaded.label_encoders, errors)
+
+    survived = np.zeros(len(errors), dtype=bool)
+    probability = np.zeros(len(errors))
+    contributions = np.zeros((len(errors), len(FEATURES))) if explain else None
+    valid = np.flatnonzero([error is None for error in errors])
+    for start in range(0, len(valid), chunk_size):
+        index = valid[start:start + chunk_size]
+        survived[index], probability[index] = _score(loaded, X[index])
+        if explain:
+            _, contributions[index] = explain_rows(loaded, X[index])
+    if on_scored is not None and len(valid):
+        on_scored(X[valid], survived[valid], probability[valid])
+    if explain:
+        return survived, probability, errors, contributions
+    return survived, probability, errors
+
+
+def predict_batch(rows, chunk_size=BATCH_CHUNK_SIZE, explain=False, loaded=None, on_scored=None):
+    """Make predictions for a list of passenger records.
+
+    Each record is a mapping with the same fields as ``predict_survival``;
+    values may be strings, as read from a CSV file. Results come back in input
+    order, one per record, carrying either ``survived`` and ``probability`` or
+    an ``error`` message. ``explain=True`` adds ``bias`` and
+    ``contributions`` to every scored record. ``loaded`` defaults to the
+    resident model; ``on_scored`` is passed to ``score_columns``.
+    """
+    loaded = loaded or model_holder.get()
+    bias = _explaining_forest(loaded).expected_value(1) if explain else None
+    columns, errors = _rows_to_columns(rows)
+    scored = score_columns(loaded, columns, errors, chunk_size, explain=explain, on_scored=on_scored)
+    survived, probability, errors = scored[:3]
+
+    results = []
+    for i, error in enumerate(errors):
+        if error is None:
+            result = {'row': i, 'survived': bool(survived[i]), 'probability': float(probability[i])}
+            if explain:
+                result.update(_explanation(bias, scored[3][i]))
+            results.append(result)
+        else:
+            results.append({'row': i, 'error': error})
+    return results
+
+
+def sweep_feature(record, feature, values, loaded=None, on_scored=None):
+    """Score one passenger for every value in ``values`` of a single feature.
+
+    The other fields stay as in ``record``. The whole grid is validated,
+    encoded and scored as one matrix with a single ``predict_proba`` call.
+    Returns ``(survived, probability)`` arrays in the order of ``values``;
+    raises ValueError if the passenger or any grid point is invalid.
+    ``on_scored(X, survived, probability)`` is called with the scored grid.
+    """
+    if feature not in FEATURES:
+        raise ValueError(f"Unknown feature: {feature}")
+    if not 0 < len(values) <= SWEEP_MAX_POINTS:
+        raise ValueError(f"A sweep needs between 1 and {SWEEP_MAX_POINTS} values")
+    if not isinstance(record, dict):
+        raise ValueError("Row must be an object with passenger fields")
+
+    loaded = loaded or model_holder.get()
+    columns = {name: [record.get(name)] * len(values) for name in FEATURES}
+    columns[feature] = list(values)
+    X, errors = validate_columns(columns, loaded.label_encoders)
+    for value, error in zip(values, errors):
+        if error is not None:
+            raise ValueError(f"{feature}={value}: {error}")
+    survived, probability = _score(loaded, X)
+    if on_scored is not None:
+        on_scored(X, survived, probability)
+    return survived, probability
+
+
+def sweep_values(start, stop, steps):
+    """Evenly spaced grid from ``start`` to ``stop`` inclusive."""
+    try:
+        start, stop, steps = float(start), float(stop), int(steps)
+    except (TypeError, ValueError):
+        raise ValueError("start, stop and steps must be numbers") from None
+    if not 0 < steps <= SWEEP_MAX_POINTS:
+        raise ValueError(f"A sweep needs between 1 and {SWEEP_MAX_POINTS} values")
+    return np.linspace(start, stop, steps).tolist()
+
+
+# Model used by forked scoring workers. It is set in the parent before the
+# pool starts, so children share its pages copy-on-write instead of each
+# unpickling their own copy.
+_scoring_model = None
+
+
+def _score_chunk(chunk):
+    """Score one chunk of a CSV file read with ``dtype=str``."""
+    n = len(chunk)
+    columns = {
+        name: chunk[name].to_numpy() if name in chunk else [None] * n
+        for name in FEATURES
+    }
+    survived, probability, errors = score_columns(_scoring_model, columns)
+
+    valid = np.array([error is None for error in errors], dtype=bool)
+    return chunk.assign(
+        survived=np.where(valid, survived.astype(int).astype(str), ''),
+        probability=np.where(valid, probability, np.nan),
+        error=[error or '' for error in errors],
+    )
+
+
+def score_csv(input_path, output_path, chunk_size=BATCH_CHUNK_SIZE, workers=0, model_path=MODEL_PATH,
+              shared_memory=False):
+    """Score a passenger CSV file chunk by chunk, streaming results to disk.
+
+    Only a bounded number of chunks is in memory at any time, so the input
+    can be larger than RAM. With ``workers`` > 1 chunks are scored in forked
+    processes that share the parent's loaded model; with ``shared_memory``
+    the workers instead attach to one copy of the flat forest in a
+    shared-memory block (see shared_scoring.py).
+    """
+    import pandas as pd
+
+    global _scoring_model
+    _scoring_model = ModelHolder(model_path).get()
+
+    reader = pd.read_csv(input_path, dtype=str, keep_default_na=False, chunksize=chunk_size)
+    start = time.perf_counter()
+    rows = 0
+
+    with open(output_path, 'w', newline='') as out:
+        def write(frame):
+            frame.to_csv(out, header=rows == 0, index=False)
+            return len(frame)
+
+        if workers > 1:
+            if shared_memory:
+                from shared_scoring import worker_pool
+                pool_context = worker_pool(_scoring_model, workers)
+            else:
+                # Keep the model's objects out of the collector so children do
+                # not touch (and copy) its pages
+                gc.freeze()
+                pool_context = multiprocessing.get_context('fork').Pool(workers)
+            with pool_context as pool:
+                pending = deque()
+                for chunk in reader:
+                    pending.append(pool.apply_async(_score_chunk, (chunk,)))
+                    # Bound the chunks in flight so memory stays flat
+                    if len(pending) >= 2 * workers:
+                        rows += write(pending.popleft().get())
+                while pending:
+                    rows += write(pending.popleft().get())
+            gc.unfreeze()
+        else:
+            for chunk in reader:
+                rows += write(_score_chunk(chunk))
+
+    elapsed = time.perf_counter() - start
+    rate = rows / elapsed if elapsed else 0.0
+    print(f"Scored {rows} rows in {elapsed:.2f}s ({rate:.0f} rows/sec)")
+    return rows, elapsed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Train or run the Titanic survival model.")
+    subparsers = parser.add_subparsers(dest='command')
+
+    train = subparsers.add_parser('train', help="train the model and save it (default)")
+    train.add_argument('--register', action='store_true', help="also add the model to the registry as a new version")
+    train.add_argument('--compact', action='store_true',
+                       help="cap depth, drop redundant trees and store float32 arrays; writes compaction_report.json")
+    train.add_argument('--max-depth', type=int, help="depth cap for --compact (default: 10)")
+    train.add_argument('--engine', choices=list(ENGINES), default=DEFAULT_ENGINE, help="estimator to train")
+    train.add_argument('--survival-table', action='store_true',
+                       help="precompute survival probabilities over age and fare buckets into the artifact "
+                            "(forest engine only)")
+    train.add_argument('--table-tolerance', type=float, default=TOLERANCE,
+                       help="largest probability error a table bucket may have (default: %(default)s)")
+    train.add_argument('--age-grid', type=float, nargs=3, metavar=('START', 'STOP', 'WIDTH'),
+                       help="age buckets for --survival-table (default: 0 80 5)")
+    train.add_argument('--fare-grid', type=float, nargs=3, metavar=('START', 'STOP', 'WIDTH'),
+                       help="fare buckets for --survival-table (default: 0 300 10)")
+
+    search = subparsers.add_parser('search', help="search forest hyperparameters in parallel and save the best model")
+    search.add_argument('--random', type=int, metavar='N', help="sample N random candidates instead of the full grid")
+    search.add_argument('--workers', type=int, help="worker processes (default: all cores)")
+    search.add_argument('--max-accuracy-drop', type=float, default=0.0,
+                        help="accept up to this much less test accuracy than the best candidate for a faster model")
+    search.add_argument('--report', default='search_report.json', help="where to write the results of every candidate")
+
+    evaluate = subparsers.add_parser('evaluate', help="cross-validate engines and rank feature importance in parallel")
+    evaluate.add_argument('--engines', nargs='+', choices=list(ENGINES), default=[DEFAULT_ENGINE],
+                          help="engines to evaluate on the same folds")
+    evaluate.add_argument('--folds', type=int, default=5, help="cross-validation folds")
+    evaluate.add_argument('--repeats', type=int, default=5, help="shuffles per feature for permutation importance")
+    evaluate.add_argument('--workers', type=int, help="worker processes (default: all cores)")
+    evaluate.add_argument('--report', default='evaluation_report.json', help="where to write the JSON report")
+    evaluate.add_argument('--html', default='evaluation_report.html', help="where to write the HTML report")
+
+    export = subparsers.add_parser('export', help="convert a pickled model to the memory-mappable '.forest' format")
+    export.add_argument('--model', default=MODEL_PATH, help="pickled model to convert")
+    export.add_argument('--output', help="artifact directory (default: next to the model)")
+
+    fetch = subparsers.add_parser('fetch-data', help="store the training data locally for offline use")
+    fetch.add_argument('--csv', help="import from a CSV copy of the seaborn titanic dataset instead of downloading")
+
+    score = subparsers.add_parser('score', help="score a CSV file of passengers")
+    score.add_argument('input', help="CSV with pclass,sex,age,sibsp,parch,fare,embarked columns")
+    score.add_argument('output', help="where to write the scored CSV")
+    score.add_argument('--chunk-size', type=int, default=BATCH_CHUNK_SIZE, help="rows per chunk")
+    score.add_argument('--workers', type=int, default=0, help="worker processes (default: score in-process)")
+    score.add_argument('--model', default=MODEL_PATH, help="model artifact to use")
+    score.add_argument('--shared-memory', action='store_true',
+                       help="workers attach to one shared-memory copy of the forest instead of forking the parent; "
+                            "they walk the NumPy forest, about 4-5x slower per core than scikit-learn, so this "
+                            "only beats in-process scoring with roughly 5 or more free cores "
+                            "(measure with `benchmark.py scaling`)")
+
+    args = parser.parse_args(argv)
+    if args.command == 'score':
+        score_csv(args.input, args.output, args.chunk_size, args.workers, args.model, args.shared_memory)
+    elif args.command == 'search':
+        from tuning import search_hyperparameters
+        search_hyperparameters(
+            n_random=args.random,
+            workers=args.workers,
+            max_accuracy_drop=args.max_accuracy_drop,
+            report_path=args.report,
+        )
+    elif args.command == 'evaluate':
+        from evaluation import evaluate_models
+        evaluate_models(
+            engines=args.engines,
+            folds=args.folds,
+            repeats=args.repeats,
+            workers=args.workers,
+            report_path=args.report,
+            html_path=args.html,
+        )
+    elif args.command == 'export':
+        model, label_encoders = load_model(args.model)
+        export_model(model, label_encoders, args.output or forest_path_for(args.model))
+    elif args.command == 'fetch-data':
+        fetch_dataset(args.csv)
+    else:
+        train_model(
+            register=getattr(args, 'register', False),
+            compact=getattr(args, 'compact', False),
+            max_depth=getattr(args, 'max_depth', None),
+            engine=getattr(args, 'engine', DEFAULT_ENGINE),
+            survival_table=getattr(args, 'survival_table', False),
+            table_tolerance=getattr(args, 'table_tolerance', TOLERANCE),
+            table_grids={name: getattr(args, name) for name in ('age_grid', 'fare_grid')
+                         if getattr(args, name, None)},
+        )
+
+
 if __name__ == '__main__':
-    train_model()
+    main()
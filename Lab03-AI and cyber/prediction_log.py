@@ -0,0 +1,184 @@
+import glob
+import os
+import queue
+import threading
+import time
+
+import numpy as np
+
+PREDICTION_LOG_DIR = os.environ.get('TITANIC_PREDICTION_LOG')
+SEGMENT_BYTES = 64 * 2 ** 20
+
+# One fixed-width little-endian record per prediction; features are in
+# model.FEATURES order, encoded as the model saw them
+RECORD_DTYPE = np.dtype([
+    ('timestamp', '<f8'),
+    ('features', '<f4', (7,)),
+    ('probability', '<f4'),
+    ('latency_ms', '<f4'),
+    ('generation', '<u4'),
+    ('survived', 'u1'),
+])
+
+# Every segment starts with the magic bytes, a format version and the
+# record size, so a reader can reject files it does not understand
+MAGIC = b'TTNCPLOG'
+VERSION = 1
+HEADER_DTYPE = np.dtype([('magic', 'S8'), ('version', '<u4'), ('record_size', '<u4')])
+
+
+def _header():
+    return np.array([(MAGIC, VERSION, RECORD_DTYPE.itemsize)], dtype=HEADER_DTYPE).tobytes()
+
+
+class PredictionLog:
+    """Append predictions to rotating binary segment files from a background thread.
+
+    ``log`` only puts a tuple on a bounded queue, and ``log_many`` one
+    structured array for a whole batch, so neither waits for the disk; when
+    the queue is full the records are dropped and counted. The writer
+    thread drains whatever is queued, packs it into one structured array
+    and appends it to the current segment. A segment is closed and a
+    new one started before it would grow past ``segment_bytes``. Each process
+    writes its own segments (the pid is in the file name), so server
+    workers never interleave records.
+    """
+
+    def __init__(self, directory, segment_bytes=SEGMENT_BYTES, max_queue=10000, max_batch_size=1024):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.max_batch_size = max_batch_size
+        self.logged = 0
+        self.dropped = 0
+        self.written = 0
+        self.segments = 0
+        self.last_error = None
+        self._queue = queue.Queue(max_queue)
+        self._thread = None
+        self._lock = threading.Lock()
+        self._file = None
+        self._pid = None
+        self._size = 0
+
+    def log(self, features, survived, probability, generation, latency_ms):
+        """Queue one prediction for writing; never blocks."""
+        self._ensure_started()
+        try:
+            self._queue.put_nowait((time.time(), features, probability, latency_ms, generation, survived))
+            self.logged += 1
+        except queue.Full:
+            self.dropped += 1
+
+    def log_many(self, features, survived, probability, generation, latency_ms):
+        """Queue a batch of predictions (feature matrix and arrays) as one item; never blocks."""
+        records = np.empty(len(features), dtype=RECORD_DTYPE)
+        records['timestamp'] = time.time()
+        records['features'] = features
+        records['probability'] = probability
+        records['latency_ms'] = latency_ms
+        records['generation'] = generation
+        records['survived'] = survived
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(records)
+            self.logged += len(records)
+        except queue.Full:
+            self.dropped += len(records)
+
+    def flush(self):
+        """Wait until every queued record is on disk."""
+        self._queue.join()
+
+    def _ensure_started(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='prediction-log', daemon=True)
+                self._thread.start()
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        while len(batch) < self.max_batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            try:
+                # Single predictions are tuples, batches arrive as record arrays
+                single = [item for item in batch if isinstance(item, tuple)]
+                records = np.concatenate([np.array(single, dtype=RECORD_DTYPE)]
+                                         + [item for item in batch if not isinstance(item, tuple)])
+                self._write(records)
+                self.written += len(records)
+            except Exception as e:
+                self.last_error = str(e)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _write(self, records):
+        while len(records):
+            # A forked worker must not keep appending to its parent's segment
+            if (self._file is None or self._pid != os.getpid()
+                    or self._size + RECORD_DTYPE.itemsize > self.segment_bytes):
+                self._rotate()
+            room = max((self.segment_bytes - self._size) // RECORD_DTYPE.itemsize, 1)
+            chunk, records = records[:room], records[room:]
+            self._file.write(chunk.tobytes())
+            self._size += chunk.nbytes
+        self._file.flush()
+
+    def _rotate(self):
+        if self._file is not None and self._pid == os.getpid():
+            self._file.close()
+        os.makedirs(self.directory, exist_ok=True)
+        self._pid = os.getpid()
+        name = f"predictions-{time.strftime('%Y%m%dT%H%M%S')}-{self._pid}-{self.segments:04d}.bin"
+        self._file = open(os.path.join(self.directory, name), 'ab')
+        self._file.write(_header())
+        self._size = HEADER_DTYPE.itemsize
+        self.segments += 1
+
+    def stats(self):
+        """Counters for monitoring."""
+        return {
+            'directory': self.directory,
+            'logged': self.logged,
+            'written': self.written,
+            'dropped': self.dropped,
+            'queued': self._queue.qsize(),
+            'segments': self.segments,
+            'last_error': self.last_error,
+        }
+
+
+def read_segment(path):
+    """Memory-map one segment as a structured array of ``RECORD_DTYPE`` records.
+
+    A record cut short by a crash at the end of the file is ignored.
+    """
+    header = np.fromfile(path, dtype=HEADER_DTYPE, count=1)
+    if len(header) != 1 or header['magic'][0] != MAGIC:
+        raise ValueError(f"{path} is not a prediction log segment")
+    if header['version'][0] != VERSION or header['record_size'][0] != RECORD_DTYPE.itemsize:
+        raise ValueError(f"{path} uses an unsupported record format")
+
+    count = (os.path.getsize(path) - HEADER_DTYPE.itemsize) // RECORD_DTYPE.itemsize
+    if count == 0:
+        return np.empty(0, dtype=RECORD_DTYPE)
+    return np.memmap(path, dtype=RECORD_DTYPE, mode='r', offset=HEADER_DTYPE.itemsize, shape=(count,))
+
+
+def read_log(directory):
+    """Every record in ``directory`` as one structured array, ordered by time."""
+    paths = sorted(glob.glob(os.path.join(directory, 'predictions-*.bin')))
+    if not paths:
+        return np.empty(0, dtype=RECORD_DTYPE)
+    records = np.concatenate([read_segment(path) for path in paths])
+    return records[np.argsort(records['timestamp'], kind='stable')]
@@ -0,0 +1,174 @@
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from encoding import build_tables
+from forest import FlatForest
+from model import FEATURES, ModelHolder, forest_path_for, save_model
+from prediction_cache import PredictionCache
+
+REGISTRY_DIR = os.environ.get('TITANIC_REGISTRY_DIR', 'models')
+# Resident models are evicted, least recently used first, above this size
+MEMORY_BUDGET = int(float(os.environ.get('TITANIC_REGISTRY_MEMORY_MB', 512)) * 2 ** 20)
+# Each resident version gets a small prediction cache of its own
+VERSION_CACHE_SIZE = 1024
+
+METADATA_FILE = 'metadata.json'
+ARTIFACT_FILE = 'model.pkl'
+VERSION_PATTERN = re.compile(r'^v(\d+)$')
+
+
+class UnknownModelVersion(LookupError):
+    """Raised when a request names a version that is not in the registry."""
+
+
+ResidentModel = namedtuple('ResidentModel', ['holder', 'cache', 'nbytes'])
+
+
+def _version_number(version):
+    match = VERSION_PATTERN.match(version)
+    return int(match.group(1)) if match else None
+
+
+def _directory_size(path):
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    return sum(os.path.getsize(os.path.join(base, name)) for base, _, names in os.walk(path) for name in names)
+
+
+def register_model(model, label_encoders, metrics=None, root=REGISTRY_DIR, version=None, drift_reference=None,
+                   survival_table=None):
+    """Save a fitted model as a new registry version and return its metadata.
+
+    Versions are named ``v1``, ``v2``, ... in registration order. Each one
+    is a directory holding the pickled model, its memory-mappable '.forest'
+    export and ``metadata.json`` with the metrics, feature schema and
+    artifact sizes. ``metadata.json`` is written last, so a version only
+    appears once it is complete.
+    """
+    os.makedirs(root, exist_ok=True)
+    if version is None:
+        numbers = [_version_number(name) for name in os.listdir(root)]
+        version = f"v{max([n for n in numbers if n is not None], default=0) + 1}"
+    elif _version_number(version) is None:
+        raise ValueError(f"Version names look like 'v1', not {version!r}")
+
+    directory = os.path.join(root, version)
+    os.makedirs(directory)
+    artifact = os.path.join(directory, ARTIFACT_FILE)
+    save_model(model, label_encoders, artifact, drift_reference, survival_table)
+
+    forest_path = forest_path_for(artifact)
+    metadata = {
+        'version': version,
+        'created_at': time.time(),
+        'model': type(model).__name__,
+        'params': {k: v for k, v in getattr(model, 'get_params', dict)().items()
+                   if isinstance(v, (int, float, str, bool, type(None)))},
+        'metrics': metrics or {},
+        'features': FEATURES,
+        'encoding_tables': build_tables(label_encoders),
+        'size_bytes': os.path.getsize(artifact),
+        'forest_bytes': _directory_size(forest_path) if os.path.exists(forest_path) else None,
+    }
+    tmp_path = os.path.join(directory, METADATA_FILE + '.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump(metadata, f, indent=2)
+    os.replace(tmp_path, os.path.join(directory, METADATA_FILE))
+    print(f"Registered model {version} in {root}")
+    return metadata
+
+
+class ModelRegistry:
+    """Serve several registered model versions from one process.
+
+    A version is loaded the first time a request asks for it, through its
+    own ``ModelHolder``, preferring the memory-mapped '.forest' artifact so
+    versions share page cache with other workers instead of each holding a
+    private copy. When the resident models exceed ``memory_budget`` bytes,
+    the least recently used ones are dropped; requests already holding them
+    finish undisturbed.
+    """
+
+    def __init__(self, root=REGISTRY_DIR, memory_budget=MEMORY_BUDGET):
+        self.root = root
+        self.memory_budget = memory_budget
+        self.loads = 0
+        self.evictions = 0
+        self._resident = OrderedDict()
+        self._lock = threading.Lock()
+
+    def versions(self):
+        """Metadata of every complete version, oldest first."""
+        if not os.path.isdir(self.root):
+            return []
+        names = [name for name in os.listdir(self.root) if _version_number(name) is not None]
+        return [self.metadata(name) for name in sorted(names, key=_version_number)
+                if os.path.exists(os.path.join(self.root, name, METADATA_FILE))]
+
+    def metadata(self, version):
+        """Metadata saved with ``version``."""
+        if _version_number(str(version)) is None:
+            raise UnknownModelVersion(f"Unknown model version: {version}")
+        try:
+            with open(os.path.join(self.root, version, METADATA_FILE)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            raise UnknownModelVersion(f"Unknown model version: {version}") from None
+
+    def artifact_path(self, version):
+        artifact = os.path.join(self.root, version, ARTIFACT_FILE)
+        forest_path = forest_path_for(artifact)
+        return forest_path if os.path.isdir(forest_path) else artifact
+
+    def get(self, version):
+        """Return ``(LoadedModel, PredictionCache)`` for ``version``, loading it if needed."""
+        with self._lock:
+            resident = self._resident.get(version)
+            if resident is None:
+                self.metadata(version)
+                holder = ModelHolder(self.artifact_path(version))
+                loaded = holder.get()
+                resident = ResidentModel(holder, PredictionCache(VERSION_CACHE_SIZE), self._resident_bytes(loaded, holder))
+                self._resident[version] = resident
+                self.loads += 1
+                self._evict(keep=version)
+            else:
+                self._resident.move_to_end(version)
+        return resident.holder.get(), resident.cache
+
+    def _resident_bytes(self, loaded, holder):
+        if isinstance(loaded.model, FlatForest):
+            return loaded.forest.nbytes
+        # A pickled estimator takes about its file size, plus the compiled forest
+        return os.path.getsize(holder.path) + (loaded.forest.nbytes if loaded.forest is not None else 0)
+
+    def _evict(self, keep):
+        while self.memory_used() > self.memory_budget and len(self._resident) > 1:
+            version = next(iter(self._resident))
+            if version == keep:
+                self._resident.move_to_end(version)
+                continue
+            del self._resident[version]
+            self.evictions += 1
+
+    def memory_used(self):
+        return sum(resident.nbytes for resident in self._resident.values())
+
+    def stats(self):
+        """Counters for monitoring."""
+        return {
+            'root': self.root,
+            'resident': list(self._resident),
+            'memory_used': self.memory_used(),
+            'memory_budget': self.memory_budget,
+            'loads': self.loads,
+            'evictions': self.evictions,
+        }
+
+
+# Shared by every request in this process
+model_registry = ModelRegistry()
@@ -0,0 +1,141 @@
+import os
+import queue
+import threading
+
+import numpy as np
+
+from model import ModelHolder
+
+SHADOW_MODEL_PATH = os.environ.get('TITANIC_SHADOW_MODEL')
+# Probability deltas (candidate - primary) are counted into these bins
+DELTA_EDGES = np.linspace(-1.0, 1.0, 21)
+
+
+class ShadowScorer:
+    """Score a candidate model on copies of live inputs, off the request path.
+
+    Requests ``submit`` the encoded features they scored along with the
+    primary model's answer and return immediately. Background worker threads
+    drain the queue in batches of up to ``max_batch_size`` rows, score each
+    batch with one ``predict_proba`` call on the candidate and fold the
+    results into running totals and a fixed delta histogram, so memory stays
+    constant however much traffic is mirrored. When the queue is full, inputs
+    are dropped and counted rather than slowing the request down.
+
+    The candidate is loaded through a ``ModelHolder``, so any artifact
+    ``train_model`` writes works and a retrained candidate is picked up
+    without a restart.
+    """
+
+    def __init__(self, path, workers=1, max_queue=1000, max_batch_size=64):
+        self.holder = ModelHolder(path)
+        self.workers = workers
+        self.max_batch_size = max_batch_size
+        self.submitted = 0
+        self.dropped = 0
+        self.errors = 0
+        self.last_error = None
+        self._queue = queue.Queue(max_queue)
+        self._threads = []
+        self._lock = threading.Lock()
+        self._reset_totals()
+
+    def _reset_totals(self):
+        self.scored = 0
+        self.agreements = 0
+        self.delta_sum = 0.0
+        self.abs_delta_sum = 0.0
+        self.max_abs_delta = 0.0
+        self.delta_counts = np.zeros(len(DELTA_EDGES) - 1, dtype=np.int64)
+
+    def submit(self, features, survived, probability):
+        """Queue one scored input for the candidate; never blocks."""
+        self._ensure_started()
+        self.submitted += 1
+        try:
+            self._queue.put_nowait((features, survived, probability))
+        except queue.Full:
+            self.dropped += 1
+
+    def flush(self):
+        """Wait until everything submitted so far has been scored."""
+        self._queue.join()
+
+    def _ensure_started(self):
+        if len(self._threads) == self.workers and all(thread.is_alive() for thread in self._threads):
+            return
+        with self._lock:
+            self._threads = [thread for thread in self._threads if thread.is_alive()]
+            while len(self._threads) < self.workers:
+                thread = threading.Thread(target=self._run, name='shadow-scorer', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        while len(batch) < self.max_batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            try:
+                self._score(batch)
+            except Exception as e:
+                with self._lock:
+                    self.errors += len(batch)
+                    self.last_error = str(e)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _score(self, batch):
+        loaded = self.holder.get()
+        model = loaded.forest if loaded.forest is not None else loaded.model
+        X = np.array([features for features, _, _ in batch], dtype=float)
+        candidate = model.predict_proba(X)
+        candidate_survived = model.classes_.take(np.argmax(candidate, axis=1)).astype(bool)
+        primary_survived = np.array([survived for _, survived, _ in batch], dtype=bool)
+        delta = candidate[:, 1] - np.array([probability for _, _, probability in batch])
+
+        bins = np.clip(np.searchsorted(DELTA_EDGES, delta, side='right') - 1, 0, len(self.delta_counts) - 1)
+        with self._lock:
+            self.scored += len(batch)
+            self.agreements += int(np.count_nonzero(candidate_survived == primary_survived))
+            self.delta_sum += float(delta.sum())
+            self.abs_delta_sum += float(np.abs(delta).sum())
+            self.max_abs_delta = max(self.max_abs_delta, float(np.abs(delta).max()))
+            self.delta_counts += np.bincount(bins, minlength=len(self.delta_counts))
+
+    def reset(self):
+        """Start a fresh comparison, for example after replacing the candidate."""
+        with self._lock:
+            self._reset_totals()
+
+    def report(self):
+        """Agreement with the primary model and the distribution of probability deltas."""
+        candidate = self.holder.stats()
+        with self._lock:
+            scored = self.scored
+            return {
+                'candidate': self.holder.path,
+                'candidate_sha256': candidate['sha256'],
+                'submitted': self.submitted,
+                'scored': scored,
+                'dropped': self.dropped,
+                'errors': self.errors,
+                'last_error': self.last_error,
+                'queued': self._queue.qsize(),
+                'agreement_rate': self.agreements / scored if scored else None,
+                'mean_delta': self.delta_sum / scored if scored else None,
+                'mean_abs_delta': self.abs_delta_sum / scored if scored else None,
+                'max_abs_delta': self.max_abs_delta,
+                'delta_histogram': {
+                    'edges': DELTA_EDGES.tolist(),
+                    'counts': self.delta_counts.tolist(),
+                },
+            }
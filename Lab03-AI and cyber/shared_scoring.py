@@ -0,0 +1,134 @@
+import multiprocessing
+import os
+import time
+from contextlib import contextmanager
+from multiprocessing import shared_memory
+
+import numpy as np
+
+import model
+from encoding import tables_to_encoders
+from forest import FOREST_ARRAYS, FlatForest
+
+# Array offsets in the shared block are rounded up to this many bytes
+ALIGNMENT = 64
+
+# Keeps each worker's attachment to the shared block open
+_attached = None
+
+
+class SharedForest:
+    """A ``FlatForest`` copied once into a ``multiprocessing.shared_memory`` block.
+
+    ``spec`` is a small picklable description (block name, array layout,
+    depth and classes) that workers pass to ``attach_forest`` to map the
+    same pages as read-only NumPy views, without unpickling or copying the
+    model. The block is freed when the context manager exits, so create it
+    before starting the workers and keep it open until they are done.
+    """
+
+    def __init__(self, forest):
+        arrays = [np.ascontiguousarray(getattr(forest, name)) for name in FOREST_ARRAYS]
+        layout = []
+        size = 0
+        for name, array in zip(FOREST_ARRAYS, arrays):
+            offset = -(-size // ALIGNMENT) * ALIGNMENT
+            layout.append((name, array.dtype.str, array.shape, offset))
+            size = offset + array.nbytes
+
+        self.shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        for (_, dtype, shape, offset), array in zip(layout, arrays):
+            np.ndarray(shape, dtype, buffer=self.shm.buf, offset=offset)[...] = array
+        self.spec = {
+            'name': self.shm.name,
+            'layout': layout,
+            'max_depth': forest.max_depth,
+            'classes': forest.classes_.tolist(),
+        }
+
+    def close(self):
+        self.shm.close()
+        self.shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def attach_forest(spec):
+    """Map a ``SharedForest`` block; returns ``(shared_memory, forest)``."""
+    shm = shared_memory.SharedMemory(name=spec['name'])
+    arrays = {}
+    for name, dtype, shape, offset in spec['layout']:
+        array = np.ndarray(shape, dtype, buffer=shm.buf, offset=offset)
+        array.flags.writeable = False
+        arrays[name] = array
+    return shm, FlatForest(max_depth=spec['max_depth'], classes=spec['classes'], **arrays)
+
+
+def _init_worker(spec, encoding_tables, sha256):
+    global _attached
+    shm, forest = attach_forest(spec)
+    _attached = shm
+    # score_csv's chunk scorer and _score_part both read this module global
+    model._scoring_model = model.LoadedModel(
+        model=forest,
+        forest=forest,
+        label_encoders=tables_to_encoders(encoding_tables),
+        generation=0,
+        sha256=sha256,
+        mtime=None,
+        load_seconds=0.0,
+        loaded_at=time.time(),
+    )
+
+
+@contextmanager
+def worker_pool(loaded, workers=None, start_method=None):
+    """A process pool whose workers score with ``loaded``'s forest from shared memory.
+
+    Works with any start method: workers attach to the block by name
+    instead of inheriting the parent's memory. Workers walk the NumPy
+    forest, which is several times slower per core than scikit-learn, so
+    the pool only beats in-process scoring with enough free cores.
+    """
+    if loaded.forest is None:
+        raise ValueError("Shared-memory scoring needs a forest model")
+    tables = {name: dict(table.codes) for name, table in loaded.label_encoders.items()}
+    context = multiprocessing.get_context(start_method)
+    # The block is created before the pool, so workers share the parent's
+    # resource tracker and it is only freed here
+    with SharedForest(loaded.forest) as shared:
+        with context.Pool(workers or os.cpu_count(), initializer=_init_worker,
+                          initargs=(shared.spec, tables, loaded.sha256)) as pool:
+            yield pool
+
+
+def _score_part(columns):
+    return model.score_columns(model._scoring_model, columns)
+
+
+def score_parallel(loaded, columns, workers=None, chunk_size=model.BATCH_CHUNK_SIZE, start_method=None):
+    """Validate, encode and score column-wise passenger data across processes.
+
+    The input is split into ``chunk_size`` slices that are scored by a pool
+    of ``workers`` attached to one shared copy of the forest, and the
+    results are merged back in input order. Returns the same
+    ``(survived, probability, errors)`` as ``model.score_columns``.
+    """
+    n = len(columns[model.FEATURES[0]])
+    parts = [
+        {name: values[start:start + chunk_size] for name, values in columns.items()}
+        for start in range(0, n, chunk_size)
+    ]
+    with worker_pool(loaded, workers, start_method) as pool:
+        results = pool.map(_score_part, parts, chunksize=1)
+
+    if not results:
+        return np.zeros(0, dtype=bool), np.zeros(0), []
+    survived = np.concatenate([result[0] for result in results])
+    probability = np.concatenate([result[1] for result in results])
+    errors = [error for result in results for error in result[2]]
+    return survived, probability, errors
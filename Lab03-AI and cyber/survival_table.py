@@ -0,0 +1,247 @@
+import numpy as np
+
+from forest import FlatForest, export_forest
+
+# Age and fare buckets as (start, stop, width); inputs outside them are
+# scored by the model
+AGE_GRID = (0.0, 80.0, 5.0)
+FARE_GRID = (0.0, 300.0, 10.0)
+# Columns of the age and fare inputs in FEATURES order
+AGE = 2
+FARE = 5
+# Largest sibsp and parch the table covers
+MAX_SIBSP = 4
+MAX_PARCH = 3
+# A bucket is only answered from the table when the model's probability
+# everywhere in it is within this distance of the stored one
+TOLERANCE = 0.02
+# Most inputs scored to find one cell's exact range; cells that need more
+# are left to the model
+MAX_POINTS_PER_CELL = 256
+# Rows scored per predict_proba call while building
+SCORE_CHUNK_SIZE = 100000
+
+
+def _bucket_count(grid):
+    start, stop, width = grid
+    return int(round((stop - start) / width))
+
+
+class SurvivalTable:
+    """Survival probabilities precomputed over the discretized input space.
+
+    The dense ``probability`` array has one cell per pclass, sex, age
+    bucket, sibsp, parch, fare bucket and embarked code, in ``FEATURES``
+    order. Cells where the model's probability varies by more than
+    ``2 * tolerance`` across the bucket, or crosses 0.5, hold NaN. ``lookup`` finds a cell by
+    arithmetic on the encoded features, so it costs the same whatever the
+    model, and returns None for inputs that must go to the model instead.
+    """
+
+    def __init__(self, probability, age_grid, fare_grid, tolerance):
+        self.probability = probability
+        self.age_grid = tuple(float(v) for v in age_grid)
+        self.fare_grid = tuple(float(v) for v in fare_grid)
+        self.tolerance = float(tolerance)
+        self.hits = 0
+        self.fallbacks = 0
+
+    def lookup(self, features):
+        """Return ``(survived, probability)`` for an encoded row, or None."""
+        pclass, sex, age, sibsp, parch, fare, embarked = features
+        age_start, _, age_width = self.age_grid
+        fare_start, _, fare_width = self.fare_grid
+        index = (int(pclass) - 1, int(sex), int((age - age_start) // age_width), int(sibsp), int(parch),
+                 int((fare - fare_start) // fare_width), int(embarked))
+        # Fractional counts and anything outside the grid go to the model
+        in_grid = (pclass == int(pclass) and sibsp == int(sibsp) and parch == int(parch)
+                   and all(0 <= i < n for i, n in zip(index, self.probability.shape)))
+        probability = self.probability[index] if in_grid else np.nan
+        if np.isnan(probability):
+            self.fallbacks += 1
+            return None
+        self.hits += 1
+        # The model predicts the larger class; a tie goes to not surviving
+        return bool(probability > 0.5), float(probability)
+
+    def to_artifact(self):
+        """The table as a plain dict and a dense array, for saving in a model artifact."""
+        spec = {'age_grid': list(self.age_grid), 'fare_grid': list(self.fare_grid), 'tolerance': self.tolerance}
+        return spec, self.probability
+
+    @classmethod
+    def from_artifact(cls, spec, probability):
+        return cls(probability, spec['age_grid'], spec['fare_grid'], spec['tolerance'])
+
+    def stats(self):
+        """Counters for monitoring."""
+        lookups = self.hits + self.fallbacks
+        return {
+            'cells': int(self.probability.size),
+            'covered': float(np.mean(~np.isnan(self.probability))),
+            'tolerance': self.tolerance,
+            'hits': self.hits,
+            'fallbacks': self.fallbacks,
+            'hit_ratio': self.hits / lookups if lookups else 0.0,
+        }
+
+
+def _bucket_bounds(grid):
+    """Lowest and highest float32 input in each bucket, one float32 step wider.
+
+    The forest compares inputs as float32, and the step covers inputs that
+    ``lookup``'s float64 arithmetic puts in a neighbouring bucket.
+    """
+    start, _, width = grid
+    edges = (start + width * np.arange(_bucket_count(grid) + 1)).astype(np.float32)
+    return np.nextafter(edges[:-1], np.float32(-np.inf)), np.nextafter(edges[1:], np.float32(np.inf))
+
+
+def _walk_boxes(forest, low, high):
+    """Bound the forest's probability over boxes of inputs.
+
+    Box ``i`` holds every row between ``low[i]`` and ``high[i]``. Each tree
+    is walked once for all boxes, following both children wherever a split
+    threshold falls inside a box. Returns the lowest and highest probability
+    any row in each box can get, as the sum of every tree's lowest and
+    highest reachable leaf, and the ``(box, feature, threshold)`` splits
+    that cut through a box.
+    """
+    value = forest.value[:, 1]
+    lower = np.zeros(len(low))
+    upper = np.zeros(len(low))
+    cuts = []
+    for root in forest.roots:
+        boxes = np.arange(len(low))
+        nodes = np.full(len(low), root)
+        tree_low = np.full(len(low), np.inf)
+        tree_high = np.full(len(low), -np.inf)
+        while len(boxes):
+            leaf = forest.left[nodes] == nodes
+            np.minimum.at(tree_low, boxes[leaf], value[nodes[leaf]])
+            np.maximum.at(tree_high, boxes[leaf], value[nodes[leaf]])
+            boxes, nodes = boxes[~leaf], nodes[~leaf]
+            feature = forest.feature[nodes]
+            threshold = forest.threshold[nodes]
+            go_left = low[boxes, feature] <= threshold
+            go_right = high[boxes, feature] > threshold
+            both = go_left & go_right
+            cuts.append((boxes[both], feature[both], threshold[both]))
+            boxes = np.concatenate([boxes[go_left], boxes[go_right]])
+            nodes = np.concatenate([forest.left[nodes[go_left]], forest.right[nodes[go_right]]])
+        lower += tree_low
+        upper += tree_high
+    cuts = [np.concatenate(parts) for parts in zip(*cuts)]
+    return lower / forest.n_trees, upper / forest.n_trees, cuts
+
+
+def _interval_points(cells, low, cut_cells, cut_thresholds):
+    """One float32 input per interval between a cell's thresholds on one feature.
+
+    Returns ``(cell, value)`` pairs sorted by cell: the cell's lowest input
+    and the first float32 input above each threshold that cuts it.
+    """
+    above = cut_thresholds.astype(np.float32)
+    above = np.where(above <= cut_thresholds, np.nextafter(above, np.float32(np.inf)), above)
+    cell = np.concatenate([cells, cut_cells])
+    value = np.concatenate([low[cells], above])
+    order = np.lexsort((value, cell))
+    return cell[order], value[order]
+
+
+def _exact_ranges(model, low, cells, cuts, max_points):
+    """Lowest and highest probability over each of ``cells``, scored exactly.
+
+    Between consecutive split thresholds on age and fare the forest gives
+    one answer, so scoring one input per pair of age and fare intervals
+    finds the true range. Cells that would need more than ``max_points``
+    inputs get NaN.
+    """
+    cut_cells, cut_features, cut_thresholds = cuts
+    lowest = np.full(len(low), np.nan)
+    highest = np.full(len(low), np.nan)
+    wanted = np.zeros(len(low), dtype=bool)
+    wanted[cells] = True
+
+    points = []
+    for feature in (AGE, FARE):
+        # Duplicate thresholds from different trees give the same interval
+        keep = wanted[cut_cells] & (cut_features == feature)
+        pairs = np.unique(np.stack([cut_cells[keep], cut_thresholds[keep]]), axis=1)
+        points.append(_interval_points(cells, low[:, feature], pairs[0].astype(np.intp), pairs[1]))
+    (age_cells, ages), (fare_cells, fares) = points
+    n_ages = np.bincount(age_cells, minlength=len(low))
+    n_fares = np.bincount(fare_cells, minlength=len(low))
+    small = wanted & (n_ages * n_fares <= max_points)
+
+    # Pair every age point of a small cell with each of its fare points
+    age_keep = small[age_cells]
+    age_cells, ages = age_cells[age_keep], ages[age_keep]
+    fare_keep = small[fare_cells]
+    fare_cells, fares = fare_cells[fare_keep], fares[fare_keep]
+    fare_start = np.concatenate([[0], np.cumsum(n_fares * small)])[:-1]
+    repeats = n_fares[age_cells]
+    point_cells = np.repeat(age_cells, repeats)
+    within = np.arange(len(point_cells)) - np.repeat(np.cumsum(repeats) - repeats, repeats)
+    X = low[point_cells].copy()
+    X[:, AGE] = np.repeat(ages, repeats)
+    X[:, FARE] = fares[fare_start[point_cells] + within]
+
+    probability = np.concatenate([model.predict_proba(X[i:i + SCORE_CHUNK_SIZE])[:, 1]
+                                  for i in range(0, len(X), SCORE_CHUNK_SIZE)] or [np.zeros(0)])
+    lowest[small], highest[small] = np.inf, -np.inf
+    np.minimum.at(lowest, point_cells, probability)
+    np.maximum.at(highest, point_cells, probability)
+    return lowest, highest
+
+
+def build_survival_table(model, label_encoders, age_grid=AGE_GRID, fare_grid=FARE_GRID, max_sibsp=MAX_SIBSP,
+                         max_parch=MAX_PARCH, tolerance=TOLERANCE, max_points=MAX_POINTS_PER_CELL):
+    """Find the cells of the grid a random forest is flat on and store its probability there.
+
+    A cell keeps the value halfway between the lowest and highest
+    probability the forest gives any input in it, when those are within
+    ``2 * tolerance`` of each other and on the same side of 0.5. The range comes from the forest's own
+    split thresholds, so the stored value is within ``tolerance`` of the
+    model for every input in a kept cell. Walking the trees over each cell
+    bounds the range first; cells the bound rejects are scored once per
+    threshold interval, up to ``max_points`` inputs each.
+    """
+    from sklearn.ensemble import RandomForestClassifier
+
+    if isinstance(model, RandomForestClassifier):
+        forest = export_forest(model)
+    elif isinstance(model, FlatForest):
+        forest = model
+    else:
+        raise ValueError("Survival tables need a random forest model")
+
+    n_sex = len(label_encoders['sex'].classes_)
+    n_embarked = len(label_encoders['embarked'].classes_)
+    age_low, age_high = _bucket_bounds(age_grid)
+    fare_low, fare_high = _bucket_bounds(fare_grid)
+    shape = (3, n_sex, len(age_low), max_sibsp + 1, max_parch + 1, len(fare_low), n_embarked)
+
+    # One box of inputs per cell; the other features take a single value
+    index = np.indices(shape).reshape(len(shape), -1)
+    low = np.stack([index[0] + 1, index[1], age_low[index[2]], index[3], index[4], fare_low[index[5]],
+                    index[6]], axis=1).astype(np.float32)
+    high = low.copy()
+    high[:, AGE] = age_high[index[2]]
+    high[:, FARE] = fare_high[index[5]]
+
+    lower, upper, cuts = _walk_boxes(forest, low, high)
+    loose = np.flatnonzero((upper - lower) / 2 > tolerance)
+    lowest, highest = _exact_ranges(model, low, loose, cuts, max_points)
+    lower[loose], upper[loose] = lowest[loose], highest[loose]
+
+    table = ((lower + upper) / 2).reshape(shape)
+    with np.errstate(invalid='ignore'):
+        # A cell on both sides of 0.5 has no single survived answer
+        kept = ((upper - lower) / 2 <= tolerance) & ((lower > 0.5) | (upper <= 0.5))
+    table[~kept.reshape(shape)] = np.nan
+
+    survival_table = SurvivalTable(table, age_grid, fare_grid, tolerance)
+    print(f"Survival table: {table.size} cells, {survival_table.stats()['covered']:.1%} within "
+          f"{tolerance:g} of the model")
+    return survival_table
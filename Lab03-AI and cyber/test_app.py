@@ -0,0 +1,776 @@
+"""Test suite for the Titanic Survival Predictor."""
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestClassifier
+
+# Artifacts pickled by another scikit-learn release warn on every load
+warnings.filterwarnings("ignore")
+
+import app as app_module
+import model
+from app import app
+from batcher import MicroBatcher
+from benchmark import compare_to_baseline, random_passengers, random_records
+from compaction import keep_trees, select_trees, to_float32, truncate_depth
+from drift import DriftMonitor, population_stability_index, reference_histograms
+from encoding import EncodingTable
+from evaluation import evaluate_models
+from forest import export_forest
+from model import MODEL_PATH, ModelHolder, forest_path_for, model_holder, predict_survival, score_csv
+from prediction_cache import PredictionCache
+from prediction_log import PredictionLog, read_log, read_segment
+from registry import ModelRegistry, model_registry, register_model
+from shadow import ShadowScorer
+from shared_scoring import SharedForest, attach_forest, score_parallel
+from survival_table import build_survival_table
+from tuning import candidate_grid, choose_candidate, pareto_front
+
+tmp_dir = tempfile.mkdtemp()
+
+# Keep training data written by the tests out of the working tree
+model.DATA_DIR = os.path.join(tmp_dir, "data")
+model.DATASET_PATH = os.path.join(model.DATA_DIR, "titanic.npz")
+model.DATASET_MANIFEST = os.path.join(model.DATA_DIR, "titanic.json")
+
+
+def make_dataset(n=300, seed=0):
+    """A small synthetic stand-in for the seaborn titanic dataset."""
+    rng = np.random.default_rng(seed)
+    sex = rng.choice(["male", "female"], n)
+    pclass = rng.integers(1, 4, n)
+    age = rng.uniform(1, 70, n).round()
+    age[::17] = np.nan
+    embarked = rng.choice(["S", "C", "Q"], n).astype(object)
+    embarked[::50] = None
+    survived = (rng.random(n) < np.where(sex == "female", 0.75, 0.2) - 0.05 * (pclass - 2)).astype(int)
+    return pd.DataFrame({
+        "survived": survived, "pclass": pclass, "sex": sex, "age": age,
+        "sibsp": rng.integers(0, 4, n), "parch": rng.integers(0, 3, n),
+        "fare": rng.gamma(2, 15, n).round(2), "embarked": embarked,
+    })
+
+
+PASSENGER = {
+    "pclass": "1",
+    "sex": "female",
+    "age": "29",
+    "sibsp": "0",
+    "parch": "0",
+    "fare": "100",
+    "embarked": "C",
+}
+
+passed = 0
+failed = 0
+
+
+def check(name, condition):
+    global passed, failed
+    if condition:
+        passed += 1
+        print(f"  PASS: {name}")
+    else:
+        failed += 1
+        print(f"  FAIL: {name}")
+
+
+with app.test_client() as c:
+    # ── Phase 1: Form prediction ────────────────────────
+    print("\n=== Form Prediction ===")
+
+    r = c.get("/")
+    check("Index page loads", r.status_code == 200)
+
+    r = c.post("/predict", data=PASSENGER)
+    check("Prediction renders", r.status_code == 200 and b"Survival Probability" in r.data)
+
+    r = c.post("/predict", data=dict(PASSENGER, pclass="4"))
+    check("Invalid pclass is rejected", b"Pclass must be 1, 2, or 3" in r.data)
+
+    result = predict_survival(1, "female", 29, 0, 0, 100, "C")
+    check("Direct prediction returns a probability", 0.0 <= result["probability"] <= 1.0)
+
+    # ── Phase 2: Resident model ─────────────────────────
+    print("\n=== Resident Model ===")
+
+    first = model_holder.get()
+    predict_survival(3, "male", 40, 1, 0, 8, "S")
+    check("Model is not reloaded between predictions", model_holder.get() is first)
+    # A fresh interpreter, since this suite imports scikit-learn itself
+    heavy = subprocess.run([sys.executable, "-c", "import sys, model; print(' '.join(m for m in "
+                            "('sklearn', 'pandas', 'joblib') if m in sys.modules))"],
+                           capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+    check("Importing model leaves scikit-learn and pandas unloaded",
+          heavy.returncode == 0 and heavy.stdout.strip() == "")
+
+    r = c.get("/model/status")
+    status = r.get_json()
+    check("Model status reports generation", r.status_code == 200 and status["generation"] >= 1)
+    check("Model status reports load time", status["load_seconds"] is not None)
+
+    path = os.path.join(tmp_dir, "model.pkl")
+    shutil.copy(MODEL_PATH, path)
+    holder = ModelHolder(path, check_interval=0)
+    before = holder.get()
+
+    os.utime(path)
+    check("Touching the artifact keeps the generation", holder.get() is before)
+
+    model_data = joblib.load(path)
+    model_data["note"] = "retrained"
+    joblib.dump(model_data, path)
+    after = holder.get()
+    check("Changed artifact is reloaded", after.generation == before.generation + 1)
+    check("Old snapshot stays usable", before.model is not None and before.generation == 1)
+
+    with open(path, "wb") as f:
+        f.write(b"corrupt")
+    check("Failed reload keeps the previous model", holder.get() is after and holder.last_error)
+
+    # ── Phase 3: Batch prediction ───────────────────────
+    print("\n=== Batch Prediction ===")
+
+    rows = [
+        PASSENGER,
+        dict(PASSENGER, age="abc"),
+        dict(PASSENGER, embarked="X"),
+        {"pclass": 2, "sex": "male"},
+        dict(PASSENGER, sex="male", pclass=3, age=40),
+    ]
+    r = c.post("/predict/batch", json=rows)
+    batch = r.get_json()
+    check("Batch endpoint returns one result per row", r.status_code == 200 and batch["count"] == 5)
+    check("Batch keeps input order", [res["row"] for res in batch["results"]] == [0, 1, 2, 3, 4])
+    check("Batch reports per-row errors", batch["errors"] == 3 and "error" in batch["results"][1])
+    check("Batch reports missing fields", batch["results"][3]["error"] == "Missing field: age")
+    single = predict_survival(3, "male", 40, 0, 0, 100, "C")
+    check("Batch matches single prediction", batch["results"][4]["probability"] == single["probability"])
+
+    csv_body = "pclass,sex,age,sibsp,parch,fare,embarked\n1,female,29,0,0,100,C\n3,male,22,1,0,7.25,S\n"
+    r = c.post("/predict/batch", data=csv_body, content_type="text/csv")
+    check("Batch accepts CSV", r.status_code == 200 and r.get_json()["errors"] == 0)
+
+    r = c.post("/predict/batch", json={"rows": []})
+    check("Malformed batch is rejected", r.status_code == 400)
+
+    # Over 256 rows goes to scikit-learn, which rejects a whole matrix with one infinite value
+    rows = [PASSENGER] * 300 + [dict(PASSENGER, fare="inf"), dict(PASSENGER, fare="1e39"), dict(PASSENGER, age="nan")]
+    r = c.post("/predict/batch", json=rows)
+    results = r.get_json()["results"] if r.status_code == 200 else []
+    check("Non-finite and float32-overflowing values are per-row errors",
+          r.status_code == 200 and [res.get("error") for res in results[-3:]]
+          == ["Fare must be a finite number", "Fare must be a finite number", "Age must be a finite number"]
+          and "probability" in results[0])
+    rows = [PASSENGER] * 300 + [dict(PASSENGER, sibsp="1e40"), dict(PASSENGER, parch=10 ** 40),
+                                dict(PASSENGER, sibsp=21)]
+    r = c.post("/predict/batch", json=rows)
+    results = r.get_json()["results"] if r.status_code == 200 else []
+    check("Overflowing and oversized SibSp/Parch are per-row errors",
+          r.status_code == 200 and [res.get("error") for res in results[-3:]]
+          == ["SibSp and Parch must be at most 20"] * 3 and "probability" in results[0])
+    r = c.post("/predict", data=dict(PASSENGER, fare="inf"))
+    check("Form rejects an infinite fare", b"Fare must be a finite number" in r.data)
+    r = c.post("/predict", data=dict(PASSENGER, sibsp=str(10 ** 40)))
+    check("Form rejects an oversized SibSp", b"SibSp and Parch must be at most 20" in r.data)
+
+    # ── Phase 4: CSV scoring ────────────────────────────
+    print("\n=== CSV Scoring ===")
+
+    input_path = os.path.join(tmp_dir, "passengers.csv")
+    with open(input_path, "w") as f:
+        f.write("pclass,sex,age,sibsp,parch,fare,embarked\n")
+        for i in range(25):
+            f.write(f"{1 + i % 3},{'male' if i % 2 else 'female'},{'' if i == 7 else i * 3},0,{i % 2},{i * 4},S\n")
+
+    output_path = os.path.join(tmp_dir, "scored.csv")
+    rows, elapsed = score_csv(input_path, output_path, chunk_size=10)
+    with open(output_path) as f:
+        scored = f.read().splitlines()
+    check("Scoring CLI writes every row", rows == 25 and len(scored) == 26)
+    check("Scoring CLI reports row errors", scored[8].endswith("Missing field: age"))
+
+    parallel_path = os.path.join(tmp_dir, "scored-parallel.csv")
+    score_csv(input_path, parallel_path, chunk_size=10, workers=2)
+    with open(parallel_path) as f:
+        check("Parallel scoring matches in order", f.read().splitlines() == scored)
+
+    inf_path = os.path.join(tmp_dir, "passengers-inf.csv")
+    with open(inf_path, "w") as f:
+        f.write("pclass,sex,age,sibsp,parch,fare,embarked\n")
+        for i in range(500):
+            f.write(f"1,female,30,{'1e40' if i == 300 else 0},0,{'inf' if i == 250 else 50},S\n")
+    rows, _ = score_csv(inf_path, os.path.join(tmp_dir, "scored-inf.csv"), chunk_size=500)
+    with open(os.path.join(tmp_dir, "scored-inf.csv")) as f:
+        scored_inf = f.read().splitlines()
+    check("Scoring CLI reports an infinite fare as a row error",
+          rows == 500 and scored_inf[251].endswith("Fare must be a finite number") and scored_inf[1].endswith(",")
+          and scored_inf[301].endswith("SibSp and Parch must be at most 20"))
+
+    # ── Phase 5: Flat forest ────────────────────────────
+    print("\n=== Flat Forest ===")
+
+    sklearn_model = model_holder.get().model
+    forest = export_forest(sklearn_model)
+    X = random_passengers(2000)
+    check("Flat forest matches predict_proba exactly",
+          np.array_equal(forest.predict_proba(X), sklearn_model.predict_proba(X)))
+    check("Flat forest matches predict exactly", np.array_equal(forest.predict(X), sklearn_model.predict(X)))
+    check("Flat forest scores a single row", forest.predict_proba(X[0]).shape == (1, 2))
+    check("Resident model carries the flat forest", model_holder.get().forest is not None)
+
+    # ── Phase 6: Prediction cache ───────────────────────
+    print("\n=== Prediction Cache ===")
+
+    hits_before = c.get("/model/status").get_json()["cache"]["hits"]
+    first = predict_survival(2, "male", 35, 0, 0, 13, "S")
+    again = predict_survival(2, "male", 35.0, 0, 0, 13.0, "S")
+    stats = c.get("/model/status").get_json()["cache"]
+    check("Repeated passenger is served from the cache", stats["hits"] == hits_before + 1)
+    check("Cached prediction is identical", first == again)
+
+    cache = PredictionCache(maxsize=2)
+    cache.put(1, "a", 1)
+    cache.put(1, "b", 2)
+    cache.get(1, "a")
+    cache.put(1, "c", 3)
+    check("Least recently used entry is evicted", cache.get(1, "b") is None and cache.get(1, "a") == 1)
+    check("Evictions are counted", cache.stats()["evictions"] == 1)
+    check("New model generation invalidates the cache",
+          cache.get(2, "a") is None and cache.stats()["invalidations"] == 1)
+
+    # ── Phase 7: Offline training data ──────────────────
+    print("\n=== Offline Training Data ===")
+
+    checksum = model.save_dataset(make_dataset(), "test")
+    raw, loaded_checksum = model.load_raw_dataset()
+    check("Local dataset round-trips with its checksum", loaded_checksum == checksum and len(raw) == 300)
+    check("Missing values survive the round trip", raw["embarked"].isna().sum() == 6 and raw["age"].isna().any())
+
+    X_first, y_first, _ = model.load_and_preprocess_data()
+    cached = [name for name in os.listdir(model.DATA_DIR) if name.startswith("preprocessed-")]
+    check("Preprocessed matrix is cached by checksum", cached == [f"preprocessed-v1-{checksum[:16]}.joblib"])
+    X_again, y_again, _ = model.load_and_preprocess_data()
+    check("Cached matrix matches a fresh preprocess", X_again.equals(X_first) and y_again.equals(y_first))
+
+    with open(model.DATASET_MANIFEST) as f:
+        manifest = f.read()
+    with open(model.DATASET_MANIFEST, "w") as f:
+        f.write(manifest.replace(checksum, "0" * 64))
+    try:
+        model.load_raw_dataset()
+        check("Checksum mismatch is detected", False)
+    except ValueError:
+        check("Checksum mismatch is detected", True)
+    with open(model.DATASET_MANIFEST, "w") as f:
+        f.write(manifest)
+
+    # ── Phase 8: Hyperparameter search ──────────────────
+    print("\n=== Hyperparameter Search ===")
+
+    check("Grid covers the whole search space", len(candidate_grid()) == 80)
+    check("Random search samples distinct candidates", len({str(p) for p in candidate_grid(10)}) == 10)
+
+    results = [
+        {"name": "slow-best", "accuracy": 0.82, "latency_ms": 0.30},
+        {"name": "fast-close", "accuracy": 0.81, "latency_ms": 0.10},
+        {"name": "dominated", "accuracy": 0.80, "latency_ms": 0.20},
+        {"name": "fastest", "accuracy": 0.75, "latency_ms": 0.05},
+    ]
+    front = pareto_front(results)
+    check("Pareto front drops dominated candidates",
+          [r["name"] for r in front] == ["fastest", "fast-close", "slow-best"])
+    check("Most accurate candidate is chosen by default", choose_candidate(front)["name"] == "slow-best")
+    check("Accuracy budget trades accuracy for latency",
+          choose_candidate(front, max_accuracy_drop=0.01)["name"] == "fast-close")
+
+    # ── Phase 9: Memory-mapped artifact ─────────────────
+    print("\n=== Memory-Mapped Artifact ===")
+
+    forest_path = os.path.join(tmp_dir, "model.forest")
+    model.export_model(sklearn_model, model_holder.get().label_encoders, forest_path)
+    mapped, encoders = model.load_model(forest_path)
+    check("Forest artifact is memory-mapped", isinstance(mapped.threshold, np.memmap))
+    check("Forest artifact matches the pickled model",
+          np.array_equal(mapped.predict_proba(X), sklearn_model.predict_proba(X)))
+    check("Encoders are restored", list(encoders["embarked"].transform(["C", "S"])) == [0, 2])
+
+    holder = ModelHolder(forest_path, check_interval=0)
+    first_forest = holder.get()
+    check("Holder loads the forest format", first_forest.forest is first_forest.model)
+    model.export_model(sklearn_model, encoders, forest_path)
+    check("Re-exported forest with the same content is not reloaded", holder.get() is first_forest)
+
+    # ── Phase 10: Encoding tables ───────────────────────
+    print("\n=== Encoding Tables ===")
+
+    pickled_encoders = joblib.load(MODEL_PATH)["label_encoders"]
+    table = EncodingTable.from_encoder(pickled_encoders["embarked"])
+    check("Table encodes like LabelEncoder", table.encode("S") == pickled_encoders["embarked"].transform(["S"])[0])
+    column = pd.Series(["S", "C", "Q", "S"])
+    check("Table encodes whole columns",
+          list(table.transform(column)) == list(pickled_encoders["embarked"].transform(column)))
+
+    for unknown in (["X"], ["S", "Z"]):
+        try:
+            pickled_encoders["embarked"].transform(unknown)
+        except ValueError as e:
+            expected = str(e)
+        try:
+            table.transform(unknown)
+            check(f"Unknown label {unknown} raises", False)
+        except ValueError as e:
+            check(f"Unknown label {unknown} raises the LabelEncoder error", str(e) == expected)
+
+    saved_path = os.path.join(tmp_dir, "tables.pkl")
+    model.save_model(sklearn_model, pickled_encoders, saved_path)
+    check("Lookup tables are stored at save time",
+          joblib.load(saved_path)["encoding_tables"]["sex"] == {"female": 0, "male": 1})
+
+    # ── Phase 11: Micro-batching JSON API ───────────────
+    print("\n=== Micro-Batching API ===")
+
+    r = c.post("/api/predict", json=PASSENGER)
+    check("JSON API returns a prediction",
+          r.status_code == 200 and r.get_json()["probability"] == predict_survival(1, "female", 29, 0, 0, 100, "C")["probability"])
+
+    r = c.post("/api/predict", json=dict(PASSENGER, sex="other"))
+    check("JSON API rejects invalid input", r.status_code == 400 and "Sex must be" in r.get_json()["error"])
+
+    seen_batches = []
+    slow_batcher = MicroBatcher(lambda X: (seen_batches.append(len(X)), list(X[:, 0]))[1],
+                                max_wait=0.05, max_batch_size=8)
+    with ThreadPoolExecutor(20) as pool:
+        answers = list(pool.map(lambda i: slow_batcher.predict(np.array([float(i)])), range(20)))
+    check("Each caller gets its own result", answers == list(range(20)))
+    check("Concurrent requests are merged", len(seen_batches) < 20 and max(seen_batches) <= 8)
+    check("Batcher reports its batches", "batcher" in c.get("/model/status").get_json())
+
+    # ── Phase 12: Benchmark baseline ────────────────────
+    print("\n=== Benchmark Baseline ===")
+
+    baseline = {"single": {"p50_ms": 1.0, "p95_ms": 2.0, "per_second": 1000}}
+    check("Results within tolerance pass",
+          compare_to_baseline({"single": {"p50_ms": 1.2, "p95_ms": 2.2, "per_second": 900}}, baseline, 0.25) == [])
+    regressions = compare_to_baseline({"single": {"p50_ms": 1.5, "p95_ms": 2.0, "per_second": 600}}, baseline, 0.25)
+    check("Slower latency and throughput are regressions", len(regressions) == 2)
+
+    # ── Phase 13: Prometheus metrics ────────────────────
+    print("\n=== Prometheus Metrics ===")
+
+    c.post("/predict", data=PASSENGER)
+    r = c.get("/metrics")
+    text = r.get_data(as_text=True)
+    check("Metrics are served as Prometheus text", r.status_code == 200 and r.content_type.startswith("text/plain"))
+    check("/predict requests are counted", 'titanic_requests_total{endpoint="/predict",status="200"}' in text)
+    check("/predict latency is a histogram", 'titanic_request_duration_seconds_bucket{endpoint="/predict",le="+Inf"}' in text)
+    for stage in ["validation", "encoding", "inference", "rendering"]:
+        check(f"Time in {stage} is recorded", f'titanic_predict_stage_duration_seconds_count{{stage="{stage}"}}' in text)
+    check("Model generation and cache hit ratio are exported",
+          "titanic_model_generation " in text and "titanic_prediction_cache_hit_ratio " in text)
+    check("Monotonic counts are exported as counters",
+          "# TYPE titanic_prediction_cache_hits_total counter" in text
+          and "# TYPE titanic_model_reloads_total counter" in text and "titanic_prediction_cache_hits_total " in text)
+
+    # ── Phase 14: Background model bootstrap ────────────
+    print("\n=== Model Bootstrap ===")
+
+    boot_path = os.path.join(tmp_dir, "bootstrap.pkl")
+    boot_holder = ModelHolder(boot_path, check_interval=0)
+    serving_holder = model.model_holder
+    model.model_holder = app_module.model_holder = boot_holder
+    try:
+        r = c.post("/api/predict", json=PASSENGER)
+        check("Requests get a 503 while the model is missing",
+              r.status_code == 503 and r.headers.get("Retry-After") == "5")
+        r = c.post("/predict", data=PASSENGER)
+        check("The form also answers 503", r.status_code == 503)
+
+        trained = []
+        original_train = model.train_model
+        model.train_model = lambda path: (trained.append(path), original_train(path))
+        try:
+            threads = [threading.Thread(target=model.bootstrap_model, args=(boot_path,)) for _ in range(3)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            model.train_model = original_train
+        check("Concurrent bootstraps train only once", trained == [boot_path])
+
+        boot_holder.bootstrap().join()
+        r = c.post("/api/predict", json=PASSENGER)
+        check("Trained model is picked up without a restart", r.status_code == 200 and boot_holder.stats()["loaded"])
+
+        failing_holder = ModelHolder(os.path.join(tmp_dir, "no-data.pkl"), check_interval=0)
+        model.model_holder = app_module.model_holder = failing_holder
+        attempts = []
+        model.train_model = lambda path: (attempts.append(path), 1 / 0)
+        try:
+            failing_holder.bootstrap(attempts=2, backoff=0).join()
+        finally:
+            model.train_model = original_train
+        r = c.post("/api/predict", json=PASSENGER)
+        check("A failed bootstrap is retried, then reported as a 500 without Retry-After",
+              len(attempts) == 2 and r.status_code == 500 and "Retry-After" not in r.headers
+              and "bootstrap failed" in r.get_json()["error"])
+    finally:
+        model.model_holder = app_module.model_holder = serving_holder
+
+    # ── Phase 15: Prediction explanations ───────────────
+    print("\n=== Explanations ===")
+
+    explained = predict_survival(1, "female", 29, 0, 0, 100, "C", explain=True)
+    check("Explanation covers every feature", list(explained["contributions"]) == model.FEATURES)
+    check("Contributions add up to the probability",
+          abs(explained["bias"] + sum(explained["contributions"].values()) - explained["probability"]) < 1e-9)
+
+    X = random_passengers(2000, seed=5)
+    bias, contributions = model.explain_rows(model_holder.get(), X)
+    check("Batch contributions add up to predict_proba",
+          np.allclose(bias + contributions.sum(axis=1), model_holder.get().forest.predict_proba(X)[:, 1]))
+
+    r = c.post("/predict/batch?explain=1", json=[PASSENGER, dict(PASSENGER, sex="other")])
+    results = r.get_json()["results"]
+    check("Batch endpoint explains valid rows", "contributions" in results[0] and "error" in results[1])
+    r = c.post("/api/predict?explain=1", json=PASSENGER)
+    check("JSON API explains on request", r.get_json()["contributions"] == explained["contributions"])
+
+    # ── Phase 16: What-if sweep ─────────────────────────
+    print("\n=== What-If Sweep ===")
+
+    r = c.post("/predict/sweep", json={"passenger": PASSENGER, "feature": "age", "start": 0, "stop": 80, "steps": 81})
+    curve = r.get_json()
+    check("Sweep returns one point per value",
+          r.status_code == 200 and len(curve["values"]) == len(curve["probability"]) == 81)
+    check("Sweep matches single predictions",
+          curve["probability"][29] == predict_survival(1, "female", 29, 0, 0, 100, "C")["probability"])
+
+    r = c.post("/predict/sweep", json={"passenger": PASSENGER, "feature": "sex", "values": ["male", "female"]})
+    check("Categorical features can be swept", r.status_code == 200 and len(r.get_json()["survived"]) == 2)
+
+    r = c.post("/predict/sweep", json={"passenger": PASSENGER, "feature": "fare", "values": [10, -5]})
+    check("Invalid grid points are rejected", r.status_code == 400 and "fare=-5" in r.get_json()["error"])
+    r = c.post("/predict/sweep", json={"passenger": PASSENGER, "feature": "age", "start": 0, "stop": 80, "steps": 10 ** 6})
+    check("Oversized sweeps are rejected", r.status_code == 400)
+
+    # ── Phase 17: Model registry ────────────────────────
+    print("\n=== Model Registry ===")
+
+    registry_dir = os.path.join(tmp_dir, "models")
+    X_reg, y_reg, reg_encoders = model.load_and_preprocess_data()
+    for n_estimators in (5, 20):
+        candidate = RandomForestClassifier(n_estimators=n_estimators, random_state=0).fit(X_reg, y_reg)
+        register_model(candidate, reg_encoders, {"train_accuracy": candidate.score(X_reg, y_reg)}, root=registry_dir)
+
+    registry = ModelRegistry(registry_dir)
+    versions = registry.versions()
+    check("Versions are numbered in order", [v["version"] for v in versions] == ["v1", "v2"])
+    check("Metadata records metrics, schema and size",
+          "train_accuracy" in versions[0]["metrics"] and versions[0]["features"] == model.FEATURES
+          and versions[0]["size_bytes"] > 0)
+    check("Versions load lazily", registry.stats()["resident"] == [])
+    v1, _ = registry.get("v1")
+    check("Registry serves the memory-mapped forest", v1.forest.n_trees == 5 and registry.get("v1")[0] is v1)
+
+    small = ModelRegistry(registry_dir, memory_budget=v1.forest.nbytes + 1)
+    small.get("v1")
+    small.get("v2")
+    check("Least recently used version is evicted over budget",
+          small.stats()["resident"] == ["v2"] and small.evictions == 1)
+
+    serving_root, model_registry.root = model_registry.root, registry_dir
+    try:
+        r = c.post("/api/predict?version=v1", json=PASSENGER)
+        expected = v1.forest.predict_proba(model.encode_passenger(PASSENGER, v1)[np.newaxis, :])[0, 1]
+        check("Requests can pick a version", r.status_code == 200 and r.get_json()["probability"] == expected)
+        r = c.post("/predict/batch?version=v2", json=[PASSENGER])
+        check("Batch requests can pick a version", r.status_code == 200 and r.get_json()["count"] == 1)
+        r = c.post("/api/predict?version=v9", json=PASSENGER)
+        check("Unknown versions are a 404", r.status_code == 404)
+        check("Versions are listed", [v["version"] for v in c.get("/models").get_json()["versions"]] == ["v1", "v2"])
+    finally:
+        model_registry.root = serving_root
+
+    # ── Phase 18: Shadow scoring ────────────────────────
+    print("\n=== Shadow Scoring ===")
+
+    X = random_passengers(500, seed=6)
+    primary = model_holder.get().forest.predict_proba(X)[:, 1]
+    same = ShadowScorer(MODEL_PATH)
+    for row, probability in zip(X, primary):
+        same.submit(tuple(row), probability > 0.5, probability)
+    same.flush()
+    report = same.report()
+    check("Identical candidate agrees everywhere",
+          report["scored"] == 500 and report["agreement_rate"] == 1.0 and report["max_abs_delta"] == 0.0)
+
+    other = ShadowScorer(boot_path)
+    for row, probability in zip(X, primary):
+        other.submit(tuple(row), probability > 0.5, probability)
+    other.flush()
+    report = other.report()
+    check("Deltas are aggregated into a fixed histogram",
+          sum(report["delta_histogram"]["counts"]) == 500 and len(report["delta_histogram"]["counts"]) == 20)
+    check("Agreement rate is reported", 0.0 <= report["agreement_rate"] <= 1.0 and report["errors"] == 0)
+
+    check("Shadow report needs a candidate", c.get("/shadow").status_code == 404)
+    app_module.shadow = ShadowScorer(boot_path)
+    try:
+        c.post("/predict", data=PASSENGER)
+        c.post("/api/predict", json=PASSENGER)
+        app_module.shadow.flush()
+        check("Live predictions are mirrored to the candidate", c.get("/shadow").get_json()["scored"] == 2)
+    finally:
+        app_module.shadow = None
+
+    # ── Phase 19: Forest compaction ─────────────────────
+    print("\n=== Forest Compaction ===")
+
+    full = export_forest(RandomForestClassifier(n_estimators=30, random_state=0).fit(X_reg, y_reg))
+    X = random_passengers(5000, seed=7)
+    check("float32 thresholds split exactly like float64", np.array_equal(to_float32(full).apply(X), full.apply(X)))
+    check("Keeping every tree changes nothing",
+          np.array_equal(keep_trees(full, np.ones(full.n_trees, dtype=bool)).predict_proba(X), full.predict_proba(X)))
+    shallow = truncate_depth(full, 3)
+    check("Depth cap bounds every path", shallow.max_depth == 3 and (shallow.apply(X) >= 0).all()
+          and shallow.n_nodes <= full.n_trees * 15)
+    kept = select_trees(full, X_reg, y_reg, min_trees=10)
+    accuracy = lambda forest: np.mean(forest.predict(X_reg) == y_reg)
+    check("Tree selection keeps held-out accuracy",
+          10 <= kept.sum() <= full.n_trees and accuracy(keep_trees(full, kept)) >= accuracy(full))
+
+    compact_path = os.path.join(tmp_dir, "compact.pkl")
+    report_path = os.path.join(tmp_dir, "compaction_report.json")
+    model.train_model(compact_path, compact=True, max_depth=6, report_path=report_path)
+    with open(report_path) as f:
+        report = json.load(f)
+    check("Compaction report compares before and after",
+          report["after"]["max_depth"] <= 6 and report["after"]["pickle_bytes"] < report["before"]["pickle_bytes"])
+    compact_loaded = ModelHolder(compact_path).get()
+    check("Compact artifact stores float32 arrays",
+          compact_loaded.forest.threshold.dtype == np.float32 and compact_loaded.forest.value.dtype == np.float32)
+
+    # ── Phase 20: Estimator engines ─────────────────────
+    print("\n=== Estimator Engines ===")
+
+    try:
+        model.make_estimator("xgboost")
+        check("Unknown engines are rejected", False)
+    except ValueError:
+        check("Unknown engines are rejected", True)
+
+    gb_path = os.path.join(tmp_dir, "hist_gb.pkl")
+    gb_model, _ = model.train_model(gb_path, engine="hist-gb")
+    gb_loaded = ModelHolder(gb_path).get()
+    check("Gradient boosting loads through the same holder",
+          type(gb_loaded.model).__name__ == "HistGradientBoostingClassifier" and gb_loaded.forest is None)
+    features = model.encode_features(gb_loaded, 1, "female", 29, 0, 0, 100, "C")
+    result = model.predict_encoded(gb_loaded, features, cache=PredictionCache(0))
+    check("Gradient boosting predicts like the forest interface",
+          result["probability"] == gb_model.predict_proba(np.array([features]))[0, 1])
+    results = model.predict_batch([PASSENGER, dict(PASSENGER, age="x")], loaded=gb_loaded)
+    check("Gradient boosting scores batches", "probability" in results[0] and "error" in results[1])
+    check("Only forests get a '.forest' export", not os.path.exists(forest_path_for(gb_path)))
+    try:
+        model.train_model(gb_path, compact=True, engine="hist-gb")
+        check("Compaction is forest-only", False)
+    except ValueError:
+        check("Compaction is forest-only", True)
+
+    # ── Phase 21: Input drift monitor ───────────────────
+    print("\n=== Input Drift ===")
+
+    reference = reference_histograms(X_reg)
+    check("Reference histograms count every training row", all(sum(c) == len(X_reg) for c in reference.values()))
+    check("Identical distributions have zero PSI", population_stability_index([5, 10, 85], [1, 2, 17]) == 0.0)
+
+    matching = DriftMonitor(model.FEATURES)
+    for row in X_reg.to_numpy():
+        matching.update(row)
+    report = matching.report(reference)
+    check("Training-like traffic is stable", report["status"] == "stable" and report["max_psi"] < 1e-9)
+
+    shifted = X_reg.to_numpy().copy()
+    shifted[:, model.FEATURES.index("age")] += 40
+    drifting = DriftMonitor(model.FEATURES)
+    drifting.update(shifted)
+    report = drifting.report(reference)
+    check("Shifted ages are flagged as drift", report["status"] == "drift" and report["drifted"] == ["age"])
+    check("Memory does not grow with traffic", drifting.counts["age"].shape == (len(reference["age"]),))
+
+    check("Training saves the reference with the model", ModelHolder(boot_path).get().drift_reference is not None)
+    before = app_module.drift_monitor.samples
+    c.post("/predict", data=PASSENGER)
+    c.post("/api/predict", json=PASSENGER)
+    r = c.get("/drift")
+    check("Live requests feed the drift endpoint",
+          r.status_code == 200 and r.get_json()["samples"] == before + 2 and "age" in r.get_json()["features"])
+
+    # ── Phase 22: Binary prediction log ─────────────────
+    print("\n=== Prediction Log ===")
+
+    log_dir = os.path.join(tmp_dir, "prediction-log")
+    log = PredictionLog(log_dir, segment_bytes=4096)
+    X = random_passengers(300, seed=8)
+    for i, row in enumerate(X):
+        log.log(row, i % 2 == 0, i / 300, 3, 0.5)
+    log.flush()
+    records = read_log(log_dir)
+    check("Every prediction is written", len(records) == 300 and log.stats()["dropped"] == 0)
+    check("Records round-trip inputs and outputs",
+          np.array_equal(records["features"], X.astype(np.float32)) and records["generation"].tolist() == [3] * 300
+          and np.allclose(records["probability"], np.arange(300) / 300))
+    segments = sorted(os.listdir(log_dir))
+    check("Segments rotate by size",
+          len(segments) > 1 and all(os.path.getsize(os.path.join(log_dir, n)) <= 4096 for n in segments))
+
+    last = os.path.join(log_dir, segments[-1])
+    whole = len(read_segment(last))
+    with open(last, "ab") as f:
+        f.write(b"partial")
+    check("A torn trailing record is ignored", len(read_segment(last)) == whole and len(read_log(log_dir)) == 300)
+
+    app_module.prediction_log = PredictionLog(os.path.join(tmp_dir, "app-log"))
+    try:
+        c.post("/predict", data=PASSENGER)
+        c.post("/api/predict", json=PASSENGER)
+        app_module.prediction_log.flush()
+        logged = read_log(os.path.join(tmp_dir, "app-log"))
+        check("Routes log predictions with generation and latency",
+              len(logged) == 2 and (logged["generation"] >= 1).all() and (logged["latency_ms"] > 0).all())
+
+        c.post("/predict/batch", json=[PASSENGER, dict(PASSENGER, sex="other"), dict(PASSENGER, age="40")])
+        c.post("/predict/sweep", json={"passenger": PASSENGER, "feature": "age", "start": 0, "stop": 80, "steps": 5})
+        app_module.prediction_log.flush()
+        logged = read_log(os.path.join(tmp_dir, "app-log"))
+        check("Batch and sweep predictions are logged",
+              len(logged) == 2 + 2 + 5 and sorted(logged["features"][2:4, 2].tolist()) == [29.0, 40.0]
+              and logged["features"][4:, 2].tolist() == [0, 20, 40, 60, 80])
+    finally:
+        app_module.prediction_log = None
+
+    # ── Phase 23: Shared-memory scoring ─────────────────
+    print("\n=== Shared-Memory Scoring ===")
+
+    loaded = model_holder.get()
+    X = random_passengers(500, seed=9)
+    with SharedForest(loaded.forest) as shared:
+        shm, attached = attach_forest(shared.spec)
+        check("Attached forest predicts like the original",
+              np.array_equal(attached.predict_proba(X), loaded.forest.predict_proba(X)))
+        check("Attached arrays are read-only", not attached.value.flags.writeable)
+        del attached
+        shm.close()
+
+    records = random_records(1000, seed=3)
+    columns = {name: [record[name] for record in records] for name in model.FEATURES}
+    columns["sex"][5] = "unknown"
+    expected = model.score_columns(loaded, columns)
+    survived, probability, errors = score_parallel(loaded, columns, workers=2, chunk_size=128)
+    check("Parallel batch matches in-process scoring in order",
+          np.array_equal(survived, expected[0]) and np.array_equal(probability, expected[1])
+          and errors == expected[2] and errors[5] is not None)
+
+    shared_path = os.path.join(tmp_dir, "scored-shared.csv")
+    score_csv(input_path, shared_path, chunk_size=10, workers=2, shared_memory=True)
+    with open(shared_path) as f:
+        check("Shared-memory CSV scoring matches", f.read().splitlines() == scored)
+
+    # ── Phase 24: Survival table ────────────────────────
+    print("\n=== Survival Table ===")
+
+    loaded = model_holder.get()
+    table = build_survival_table(loaded.model, loaded.label_encoders, age_grid=(0, 80, 10), fare_grid=(0, 100, 20),
+                                 tolerance=0.05)
+    centers = [(p, s, a + 5.0, sib, par, f + 10.0, e) for p in (1, 2, 3) for s in (0, 1) for a in range(0, 80, 10)
+               for sib in (0, 1) for par in (0, 1) for f in range(0, 100, 20) for e in (0, 1, 2)]
+    answers = [table.lookup(row) for row in centers]
+    # Random points anywhere inside the buckets, not only where the builder looked
+    rng = np.random.default_rng(7)
+    n = 20000
+    points = np.stack([rng.integers(1, 4, n), rng.integers(0, 2, n), rng.uniform(0, 80, n), rng.integers(0, 2, n),
+                       rng.integers(0, 2, n), rng.uniform(0, 100, n), rng.integers(0, 3, n)], axis=1)
+    expected = loaded.model.predict_proba(points)[:, 1]
+    hits = [(answer, p) for answer, p in zip(map(table.lookup, points), expected) if answer]
+    check("Table answers are within tolerance of the model anywhere in a bucket",
+          len(hits) > n // 10 and all(abs(answer[1] - p) <= 0.05 + 1e-9 for answer, p in hits))
+    check("Table answers never change the predicted label", all(answer[0] == (p > 0.5) for answer, p in hits))
+    try:
+        model.train_model(os.path.join(tmp_dir, "hist.pkl"), engine="hist-gb", survival_table=True)
+        rejected = False
+    except ValueError:
+        rejected = True
+    check("Only forests get a survival table", rejected)
+    check("Off-grid inputs fall back to the model",
+          table.lookup((1, 0, 95.0, 0, 0, 50.0, 2)) is None and table.lookup((1, 0, 30.0, 0, 0, 150.0, 2)) is None
+          and table.lookup((1, 0, 30.0, 0.5, 0, 50.0, 2)) is None and table.lookup((1, 0, 30.0, 9, 0, 50.0, 2)) is None)
+
+    table_path = os.path.join(tmp_dir, "table.pkl")
+    model.save_model(loaded.model, loaded.label_encoders, table_path, survival_table=table)
+    row = next(row for row, answer in zip(centers, answers) if answer)
+    for path in (table_path, forest_path_for(table_path)):
+        table_loaded = ModelHolder(path).get()
+        saved = table_loaded.survival_table
+        check(f"Table round-trips through {os.path.basename(path)}",
+              saved is not None and np.array_equal(saved.probability, table.probability, equal_nan=True))
+        result = model.predict_encoded(table_loaded, row, cache=PredictionCache(0))
+        check(f"Predictions come from the table ({os.path.basename(path)})",
+              saved.hits == 1 and result["probability"] == table.lookup(row)[1])
+    explained = model.predict_encoded(table_loaded, row, explain=True, cache=PredictionCache(0))
+    check("Explanations bypass the table",
+          saved.hits == 1 and explained["probability"] == loaded.forest.predict_proba(np.array([row]))[0, 1])
+    check("Status reports the survival table", "survival_table" in c.get("/model/status").get_json())
+    check("Survival table counts are exported as counters",
+          "# TYPE titanic_survival_table_hits_total counter" in c.get("/metrics").get_data(as_text=True))
+
+    # ── Phase 25: Cross-validated evaluation ────────────
+    print("\n=== Evaluation ===")
+
+    cache_files = {name: os.path.getmtime(os.path.join(model.DATA_DIR, name))
+                   for name in os.listdir(model.DATA_DIR) if name.startswith("preprocessed-")}
+    report_path = os.path.join(tmp_dir, "evaluation_report.json")
+    html_path = os.path.join(tmp_dir, "evaluation_report.html")
+    report = evaluate_models(["forest", "hist-gb"], folds=3, repeats=2, workers=2,
+                             report_path=report_path, html_path=html_path)
+    check("Evaluation reuses the cached matrix",
+          cache_files and {name: os.path.getmtime(os.path.join(model.DATA_DIR, name)) for name in os.listdir(model.DATA_DIR)
+                           if name.startswith("preprocessed-")} == cache_files)
+    check("Every engine is scored on every fold",
+          [(r["engine"], r["fold"]) for r in report["fold_results"]]
+          == [(e, f) for e in ("forest", "hist-gb") for f in range(3)])
+    check("Folds cover every row once", sum(r["test_rows"] for r in report["fold_results"]) == 2 * report["rows"])
+    importance = report["engines"]["forest"]["importance"]
+    check("Permutation importance covers every feature",
+          list(importance) == model.FEATURES and all(len(r["importances"][0]) == 2 for r in report["fold_results"]))
+    check("Engines are compared fold by fold",
+          report["comparisons"][0]["engines"] == ["forest", "hist-gb"] and "t" in report["comparisons"][0])
+    with open(report_path) as f:
+        saved = json.load(f)
+    with open(html_path) as f:
+        page = f.read()
+    check("JSON and HTML reports are written with timing",
+          saved["timing"]["wall_seconds"] > 0 and saved["engines"].keys() == report["engines"].keys()
+          and page.startswith("<!DOCTYPE html>") and "Permutation importance" in page and "embarked" in page)
+
+    # ── Summary ─────────────────────────────────────────
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    print(f"\n{'=' * 50}")
+    print(f"Results: {passed} passed, {failed} failed out of {passed + failed}")
+    if failed == 0:
+        print("ALL TESTS PASSED")
+    print(f"{'=' * 50}")
+
+    exit(0 if failed == 0 else 1)
@@ -0,0 +1,146 @@
+import itertools
+import json
+import os
+import pickle
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.model_selection import train_test_split
+
+from drift import reference_histograms
+from forest import export_forest
+from model import MODEL_PATH, load_and_preprocess_data, save_model
+
+SEARCH_SPACE = {
+    'n_estimators': [25, 50, 100, 200],
+    'max_depth': [None, 4, 6, 8, 12],
+    'min_samples_leaf': [1, 2, 4, 8],
+}
+
+# Train/test split shared by the worker processes, set by _init_worker
+_split = None
+
+
+def candidate_grid(n_random=None, seed=42):
+    """Return the full grid, or ``n_random`` distinct candidates drawn from it."""
+    names = list(SEARCH_SPACE)
+    grid = [dict(zip(names, values)) for values in itertools.product(*SEARCH_SPACE.values())]
+    if n_random is not None and n_random < len(grid):
+        grid = random.Random(seed).sample(grid, n_random)
+    return grid
+
+
+def _init_worker(split):
+    global _split
+    _split = split
+
+
+def _fit_candidate(params):
+    """Fit one candidate and return its scores with the pickled model."""
+    X_train, X_test, y_train, y_test = _split
+    start = time.perf_counter()
+    model = RandomForestClassifier(random_state=42, **params)
+    model.fit(X_train, y_train)
+    fit_seconds = time.perf_counter() - start
+
+    blob = pickle.dumps(model, protocol=pickle.HIGHEST_PROTOCOL)
+    return {
+        'params': params,
+        'accuracy': float(model.score(X_test, y_test)),
+        'size_bytes': len(blob),
+        'fit_seconds': fit_seconds,
+    }, blob
+
+
+def single_row_latency(model, row, repeat=200):
+    """Median latency in milliseconds of the serving path for one passenger."""
+    forest = export_forest(model)
+    forest.predict_proba(row)
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        forest.predict_proba(row)
+        samples.append(time.perf_counter() - start)
+    return float(np.median(samples) * 1e3)
+
+
+def pareto_front(results):
+    """Candidates no other candidate beats on both accuracy and latency."""
+    front = []
+    for result in sorted(results, key=lambda r: (r['latency_ms'], -r['accuracy'])):
+        if not front or result['accuracy'] > front[-1]['accuracy']:
+            front.append(result)
+    return front
+
+
+def choose_candidate(front, max_accuracy_drop=0.0):
+    """Pick the fastest candidate within ``max_accuracy_drop`` of the best accuracy."""
+    best_accuracy = max(result['accuracy'] for result in front)
+    eligible = [r for r in front if r['accuracy'] >= best_accuracy - max_accuracy_drop - 1e-12]
+    return min(eligible, key=lambda r: r['latency_ms'])
+
+
+def search_hyperparameters(n_random=None, workers=None, max_accuracy_drop=0.0,
+                           report_path='search_report.json', path=MODEL_PATH):
+    """Search forest hyperparameters across a process pool and save the chosen model.
+
+    Candidates are fitted in parallel. Once every fit has finished and the
+    pool has shut down, latency is measured one candidate at a time in this
+    process, so the timings are not skewed by fits competing for the CPU. The chosen model is refitted (fits are
+    deterministic) and saved in the same format as ``train_model``.
+    """
+    print("Loading and preprocessing data...")
+    X, y, label_encoders = load_and_preprocess_data()
+    split = train_test_split(X, y, test_size=0.2, random_state=42)
+    row = np.asarray(split[1], dtype=float)[:1]
+
+    candidates = candidate_grid(n_random)
+    workers = workers or os.cpu_count()
+    print(f"Fitting {len(candidates)} candidates on {workers} workers...")
+
+    start = time.perf_counter()
+    fitted = []
+    with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(split,)) as pool:
+        futures = [pool.submit(_fit_candidate, params) for params in candidates]
+        for future in as_completed(futures):
+            fitted.append(future.result())
+    fit_seconds = time.perf_counter() - start
+
+    # The pool has shut down, so no fit competes with the timing loop
+    print("Measuring single-passenger latency...")
+    results = []
+    for result, blob in fitted:
+        result['latency_ms'] = single_row_latency(pickle.loads(blob), row)
+        results.append(result)
+        print(f"  {result['params']}: accuracy {result['accuracy']:.4f}, "
+              f"{result['size_bytes'] / 1024:.0f} KiB, {result['latency_ms']:.3f} ms")
+    search_seconds = time.perf_counter() - start
+
+    front = pareto_front(results)
+    chosen = choose_candidate(front, max_accuracy_drop)
+
+    print("\nAccuracy/latency Pareto front:")
+    for result in front:
+        marker = '*' if result is chosen else ' '
+        print(f" {marker} {result['params']}: accuracy {result['accuracy']:.4f}, {result['latency_ms']:.3f} ms")
+
+    model = RandomForestClassifier(random_state=42, **chosen['params'])
+    model.fit(split[0], split[2])
+    save_model(model, label_encoders, path, reference_histograms(split[0]))
+
+    report = {
+        'search_seconds': search_seconds,
+        'fit_seconds': fit_seconds,
+        'workers': workers,
+        'max_accuracy_drop': max_accuracy_drop,
+        'chosen': chosen,
+        'pareto_front': front,
+        'candidates': sorted(results, key=lambda r: -r['accuracy']),
+    }
+    with open(report_path, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Search took {search_seconds:.1f}s; report written to {report_path}")
+    return report